@@ -0,0 +1,44 @@
+"""Latency benchmark for chip/NaviCust name search.
+
+Run with ``python benchmarks/bench_item_index.py`` from an environment with the bot's dependencies installed.
+"""
+import statistics
+import time
+
+from mrprog.bot.item_index import chip_index, ncp_index
+from mrprog.bot.supported_games import SUPPORTED_GAMES
+
+QUERIES = ["a", "air", "airshot", "Mega canon", "mega can", "swrod", "recov 12", "tankcan", "bass gs", "zzz"]
+ROUNDS = 200
+
+
+def bench(label: str, func) -> None:
+    samples = []
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            func(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<28} p50 {p50:.3f} ms  p99 {p99:.3f} ms  max {samples[-1]:.3f} ms")
+
+
+def main() -> None:
+    games = sorted({game for games in SUPPORTED_GAMES.values() for game in games})
+    for game in games:
+        start = time.perf_counter()
+        chips = chip_index(game)
+        parts = ncp_index(game)
+        build_ms = (time.perf_counter() - start) * 1000
+        print(f"BN{game}: {len(chips)} chip names, {len(parts)} part names, indexes built in {build_ms:.1f} ms")
+
+        bench(f"BN{game} chip prefix", chips.prefix_search)
+        bench(f"BN{game} chip search", chips.search)
+        bench(f"BN{game} chip fuzzy", chips.fuzzy_search)
+        bench(f"BN{game} ncp search", parts.search)
+
+
+if __name__ == "__main__":
+    main()
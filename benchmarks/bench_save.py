@@ -0,0 +1,53 @@
+"""Benchmark for generating a patched BNLC save.
+
+Compares the original approach (read the template, decrypt and re-encrypt it byte by byte) with patching a cached
+template. Run with ``python benchmarks/bench_save.py``.
+"""
+import pkgutil
+import time
+
+from mrprog.bot.save_templates import STEAM_ID_OFFSET, load_templates
+
+ROUNDS = 200
+STEAMID_32 = 123456789
+
+
+def per_byte_xor(data, key):
+    result = bytearray(data)
+    for i in range(len(data)):
+        result[i] ^= key
+    return result
+
+
+def original(name: str) -> bytearray:
+    encrypted = pkgutil.get_data("mrprog.bot", f"saves/{name}_save_0.bin")
+    xor_byte = encrypted[1]
+    decrypted = per_byte_xor(encrypted, xor_byte)
+    for i, b in enumerate(STEAMID_32.to_bytes(4, "little")):
+        decrypted[STEAM_ID_OFFSET + i] = b
+    return per_byte_xor(decrypted, xor_byte)
+
+
+def bench(label: str, func) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func()
+    per_call_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+    print(f"{label:<32} {per_call_ms:8.3f} ms/save")
+    return per_call_ms
+
+
+def main() -> None:
+    store = load_templates()
+    for name, template in store.templates.items():
+        assert template.with_steam_id(STEAMID_32) == original(name)
+        print(f"{name}: {len(template.encrypted)} bytes")
+        before = bench("  per-byte decrypt + encrypt", lambda: original(name))
+        after = bench("  cached template patch", lambda: template.with_steam_id(STEAMID_32))
+        bench("  repeat request (cached save)", lambda: store.get_save(name, STEAMID_32))
+        print(f"  speedup: {before / after:.0f}x")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
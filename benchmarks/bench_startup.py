@@ -0,0 +1,46 @@
+"""Import time and resident memory of the game data registry.
+
+Each measurement runs in a fresh interpreter so earlier imports don't skew the numbers. Run with
+``python benchmarks/bench_startup.py`` from an environment with the bot's dependencies installed.
+"""
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, time, psutil
+process = psutil.Process()
+rss_before = process.memory_info().rss
+start = time.perf_counter()
+from mrprog.bot.supported_games import CHIP_LISTS, NCP_LISTS
+import_ms = (time.perf_counter() - start) * 1000
+rss_import = process.memory_info().rss
+
+games = {games}
+start = time.perf_counter()
+for game in games:
+    CHIP_LISTS[game]
+    NCP_LISTS[game]
+load_ms = (time.perf_counter() - start) * 1000
+rss_loaded = process.memory_info().rss
+print(json.dumps([import_ms, rss_import - rss_before, load_ms, rss_loaded - rss_before]))
+"""
+
+
+def measure(games) -> None:
+    output = subprocess.check_output([sys.executable, "-c", PROBE.format(games=list(games))])
+    import_ms, import_rss, load_ms, loaded_rss = json.loads(output)
+    label = ", ".join(f"BN{game}" for game in games) or "none"
+    print(
+        f"games used: {label:<22} import {import_ms:7.1f} ms, +{import_rss / 2 ** 20:6.1f} MiB | "
+        f"first use {load_ms:7.1f} ms, total +{loaded_rss / 2 ** 20:6.1f} MiB"
+    )
+
+
+def main() -> None:
+    for games in [(), (6,), (3, 6), (3, 4, 5, 6)]:
+        measure(games)
+
+
+if __name__ == "__main__":
+    main()
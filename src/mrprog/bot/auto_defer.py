@@ -0,0 +1,141 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Deque, Dict, List, Optional, Sequence
+
+import discord
+
+from mrprog.bot.metrics import REGISTRY, MetricsRegistry, percentile
+from mrprog.bot.utils import Emotes
+
+logger = logging.getLogger(__name__)
+
+
+class CommandLatencyTracker:
+    """Time to first response per command, as a histogram plus a window of recent samples for percentiles."""
+
+    def __init__(self, window: int = 512, registry: MetricsRegistry = REGISTRY):
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+        self.deferred: Dict[str, int] = collections.Counter()
+
+        self.first_response = registry.histogram(
+            "mrprog_command_first_response_seconds",
+            "Time from a command being invoked to its first response or defer",
+            ("command",),
+            buckets=(0.05, 0.1, 0.25, 0.5, 1, 1.5, 2, 2.5, 3, 5),
+        )
+        self.deferred_total = registry.counter(
+            "mrprog_command_deferred_total", "Commands deferred for running past their latency budget", ("command",)
+        )
+
+    def observe(self, command: str, seconds: float) -> None:
+        samples = self.samples.get(command)
+        if samples is None:
+            samples = self.samples[command] = collections.deque(maxlen=self.window)
+        samples.append(seconds)
+        self.first_response.observe(seconds, command=command)
+
+    def mark_deferred(self, command: str) -> None:
+        self.deferred[command] += 1
+        self.deferred_total.inc(command=command)
+
+    def commands(self) -> List[str]:
+        return sorted(self.samples)
+
+    def percentiles(self, command: str, fractions: Sequence[float] = (0.5, 0.95, 0.99)) -> Optional[List[float]]:
+        samples = self.samples.get(command)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return [percentile(ordered, fraction) for fraction in fractions]
+
+
+COMMAND_LATENCY = CommandLatencyTracker()
+
+
+class AutoDefer:
+    """Runs a command body with a latency budget for its first response.
+
+    If the body hasn't responded ``budget`` seconds after the interaction was created (which is when Discord's
+    3 second deadline starts, not when the body does), the interaction is deferred so the deadline can't expire,
+    and later sends go out as followups instead. All responses have to go through ``send`` for that to work; it
+    shares a lock with the deferral so the two can't race.
+
+    This is an ``async with`` block rather than a decorator so discord.py still sees the command's real signature.
+    The visibility of a deferred response is fixed by the defer, so ``ephemeral`` should match what the command
+    normally sends.
+    """
+
+    def __init__(
+        self,
+        interaction: discord.Interaction,
+        command: str,
+        budget: float = 2.0,
+        ephemeral: bool = False,
+        tracker: CommandLatencyTracker = COMMAND_LATENCY,
+    ):
+        self.interaction = interaction
+        self.command = command
+        self.budget = budget
+        self.ephemeral = ephemeral
+        self.tracker = tracker
+        self.deferred = False
+
+        self._lock = asyncio.Lock()
+        self._started = 0.0
+        self._responded = False
+        self._timer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "AutoDefer":
+        # Gateway and dispatch delay already used up part of the budget. Clamp it in case the clocks disagree.
+        elapsed = (discord.utils.utcnow() - self.interaction.created_at).total_seconds()
+        self._started = time.monotonic() - min(max(elapsed, 0), self.budget)
+        self._timer = asyncio.get_running_loop().create_task(self._defer_after_budget())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        # Take the lock so a defer that's already underway finishes rather than being cancelled halfway
+        async with self._lock:
+            self._timer.cancel()
+        try:
+            await self._timer
+        except asyncio.CancelledError:
+            pass
+
+        if exc_type is not None and self.deferred and not self._responded:
+            # Otherwise the user is left looking at "thinking..." forever
+            try:
+                await self.interaction.followup.send(f"{Emotes.ERROR} Something went wrong.", ephemeral=self.ephemeral)
+            except discord.HTTPException:
+                logger.exception(f"Unable to report failure of {self.command}")
+
+    def _record_first_response(self) -> None:
+        if not self._responded and not self.deferred:
+            self.tracker.observe(self.command, time.monotonic() - self._started)
+
+    async def _defer_after_budget(self) -> None:
+        await asyncio.sleep(self._started + self.budget - time.monotonic())
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            self._record_first_response()
+            try:
+                await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+            except (discord.HTTPException, discord.InteractionResponded):
+                # Raising here would only resurface from __aexit__, masking whatever the body did
+                logger.exception(f"Unable to defer {self.command}")
+                return
+            self.deferred = True
+            self.tracker.mark_deferred(self.command)
+            logger.info(f"Deferred {self.command} {time.monotonic() - self._started:.2f}s after it was invoked")
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> None:
+        async with self._lock:
+            if self.interaction.response.is_done():
+                await self.interaction.followup.send(content, **kwargs)
+            else:
+                self._record_first_response()
+                await self.interaction.response.send_message(content, **kwargs)
+            self._responded = True
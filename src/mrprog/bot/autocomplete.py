@@ -1,8 +1,7 @@
 import discord
 from discord import app_commands
 from mmbn.gamedata.chip import Code
-from mrprog.bot.supported_games import CHIP_LISTS, NCP_LISTS
-from mrprog.utils.types import TradeItem
+from mrprog.bot.item_index import chip_index, game_data_index, ncp_index
 
 
 def autocomplete_get_game(interaction: discord.Interaction) -> int:
@@ -20,35 +19,27 @@ def limit(choices: list[app_commands.Choice[str]]) -> list[app_commands.Choice[s
     return choices[:25]
 
 
-def _make_choices(items: list[TradeItem], current: str) -> list[app_commands.Choice[str]]:
-    items_dict = dict(sorted({item.name.lower(): item for item in items}.items()))
-    lower = current.lower()
-    return limit(
-        [
-            app_commands.Choice(name=item.name, value=item.name)
-            for name_lower, item in items_dict.items()
-            if name_lower.startswith(lower)
-        ]
-    )
+_ALL_CODE_CHOICES = limit(
+    [app_commands.Choice(name=name, value=name) for name in (code.name if code != Code.Star else "*" for code in Code)]
+)
 
 
 async def chip_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
-    return _make_choices(CHIP_LISTS[game].all_chips, current)
+    return chip_index(game).search(current)
 
 
 async def chip_autocomplete_restricted(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
-    return _make_choices(CHIP_LISTS[game].tradable_obtainable_chips, current)
+    return chip_index(game, restricted=True).search(current)
 
 
 async def chipcode_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
 
-    chips = CHIP_LISTS[game].get_chips_by_name(interaction.namespace["chip_name"])
-    codes = [code.name if code != Code.Star else "*" for code in Code]
+    chips = game_data_index(game).get_chips_by_name(interaction.namespace["chip_name"])
     if len(chips) == 0:
-        return limit([app_commands.Choice(name=code, value=code) for code in codes])
+        return _ALL_CODE_CHOICES
 
     codes = [chip.code.name if chip.code != Code.Star else "*" for chip in chips]
     return [app_commands.Choice(name=code, value=code) for code in codes]
@@ -56,16 +47,16 @@ async def chipcode_autocomplete(interaction: discord.Interaction, current: str)
 
 async def ncp_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
-    return _make_choices(NCP_LISTS[game].all_parts, current)
+    return ncp_index(game).search(current)
 
 
 async def ncp_autocomplete_restricted(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
-    return _make_choices(NCP_LISTS[game].tradable_obtainable_parts, current)
+    return ncp_index(game, restricted=True).search(current)
 
 
 async def ncpcolor_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     game = autocomplete_get_game(interaction)
-    parts = NCP_LISTS[game].get_parts_by_name(interaction.namespace["part_name"])
+    parts = game_data_index(game).get_parts_by_name(interaction.namespace["part_name"])
     choices = [app_commands.Choice(name=part.color.name, value=part.color.name) for part in parts]
     return choices
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from aio_pika import Message
+
+from mrprog.bot.metrics import REGISTRY, MetricsRegistry
+
+PendingPublish = Tuple[Message, str, asyncio.Future]
+
+
+class BatchPublisher:
+    """Funnels AMQP publishes through one task so bursts go out together.
+
+    Whatever has been submitted while the previous batch was in flight is published as the next batch, with every
+    publisher confirm awaited concurrently instead of one after another. Each caller still waits for its own
+    confirm and gets the broker's error if there was one, so a lost publish is never silent.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[Message, str], Awaitable[object]],
+        max_batch: int = 100,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self._publish = publish
+        self.max_batch = max_batch
+        self._pending: "asyncio.Queue[PendingPublish]" = asyncio.Queue()
+        self._in_flight: List[PendingPublish] = []
+        self._task: Optional[asyncio.Task] = None
+
+        self.batch_size = registry.histogram(
+            "mrprog_amqp_publish_batch_size",
+            "Number of messages published per batch",
+            buckets=(1, 2, 5, 10, 20, 50, 100),
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def publish(self, message: Message, routing_key: str) -> None:
+        if self._task is None:
+            raise RuntimeError("BatchPublisher has not been started")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait((message, routing_key, future))
+        await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._in_flight = [await self._pending.get()]
+            while len(batch) < self.max_batch and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            self.batch_size.observe(len(batch))
+
+            results = await asyncio.gather(
+                *(self._publish(message, routing_key) for message, routing_key, _ in batch), return_exceptions=True
+            )
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(None)
+            self._in_flight = []
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        unsent = self._in_flight
+        self._in_flight = []
+        while not self._pending.empty():
+            unsent.append(self._pending.get_nowait())
+        for _, _, future in unsent:
+            if not future.done():
+                future.set_exception(ConnectionError("Publisher closed before the message was confirmed"))
@@ -12,6 +12,8 @@ import discord
 from discord.ext import commands
 from mrprog.utils.logging import install_logger
 
+from mrprog.bot.metrics import start_metrics_server
+
 logger = logging.getLogger(__name__)
 COGS = ["info", "admin", "trade", "save"]
 
@@ -36,11 +38,16 @@ async def main():
     parser.add_argument("--username")
     parser.add_argument("--password")
     parser.add_argument("--token")
+    parser.add_argument("--metrics-host", default="127.0.0.1")
+    parser.add_argument("--metrics-port", type=int, default=9464, help="Port for Prometheus metrics, 0 to disable")
     args = parser.parse_args()
 
     install_logger(args.host, args.username, args.password)
     bot.config = {"host": args.host, "username": args.username, "password": args.password}
 
+    if args.metrics_port:
+        await start_metrics_server(args.metrics_host, args.metrics_port)
+
     while True:
         try:
             logger.info("Logging in")
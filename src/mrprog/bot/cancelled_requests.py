@@ -0,0 +1,94 @@
+import collections
+import json
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mrprog.utils.trade import TradeRequest
+
+from mrprog.bot.queue_index import GameKey
+
+logger = logging.getLogger(__name__)
+
+
+class CancelledRequests:
+    """Correlation ids of requests that were cancelled while still sitting in a task queue.
+
+    Workers ack and drop these silently, so nothing tells the bot when one has left its queue. Instead ``prune``
+    is handed an upper bound on how many cancelled messages each task queue could still hold, worked out from the
+    broker's ready counts, and drops the ids beyond it. Cancelled messages leave a queue in delivery order, so the
+    ones that go are those that would have been delivered first. Ids loaded back from bot/cancelled have no
+    bucket and only survive while some queue has room left over for them.
+
+    The published list is also capped at ``max_entries``, dropping the longest-cancelled ids first, so a stuck
+    prune can't make every cancel republish an ever-growing payload.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        # In the order they were cancelled. The value is the bucket and delivery order within it, if known.
+        self._entries: Dict[str, Optional[Tuple[GameKey, Tuple[int, int]]]] = collections.OrderedDict()
+
+    def __contains__(self, correlation_id: object) -> bool:
+        return correlation_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, correlation_id: str, request: TradeRequest) -> None:
+        # Trade ids are handed out in submission order, which is the broker's order within a priority
+        self._entries[correlation_id] = ((request.system, request.game), (-(request.priority or 0), request.trade_id))
+        while len(self._entries) > self.max_entries:
+            dropped, _ = self._entries.popitem(last=False)
+            logger.warning(f"Too many cancelled requests, no longer tracking {dropped}")
+
+    def load(self, correlation_ids: Iterable[str]) -> None:
+        for correlation_id in correlation_ids:
+            self._entries.setdefault(correlation_id, None)
+
+    def discard(self, correlation_id: str) -> bool:
+        if correlation_id not in self._entries:
+            return False
+        del self._entries[correlation_id]
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def bucket_size(self, system: str, game: int) -> int:
+        """How many of the ids could be in the given task queue, counting those with an unknown bucket."""
+        return sum(1 for entry in self._entries.values() if entry is None or entry[0] == (system, game))
+
+    def prune(self, capacity: Dict[GameKey, int]) -> int:
+        """Drop ids that can't still be queued, given how many cancelled messages each queue could hold at most.
+
+        ``capacity`` should cover every task queue, since ids with an unknown bucket are weighed against all of
+        them. Returns how many ids were dropped.
+        """
+        by_bucket: Dict[GameKey, List[Tuple[Tuple[int, int], str]]] = collections.defaultdict(list)
+        unknown = []
+        for correlation_id, entry in self._entries.items():
+            if entry is None:
+                unknown.append(correlation_id)
+            elif entry[0] in capacity:
+                by_bucket[entry[0]].append((entry[1], correlation_id))
+
+        dropped = []
+        spare = 0
+        for game_key, room in capacity.items():
+            entries = sorted(by_bucket.get(game_key, ()))
+            room = max(room, 0)
+            # The last ``room`` in delivery order are the ones that can still be waiting
+            dropped.extend(correlation_id for _, correlation_id in entries[: max(len(entries) - room, 0)])
+            spare += max(room - len(entries), 0)
+        # Ids without a bucket could be in any queue, so they can only use room none of the others need
+        dropped.extend(unknown[: max(len(unknown) - spare, 0)])
+
+        for correlation_id in dropped:
+            del self._entries[correlation_id]
+        return len(dropped)
+
+    def to_json(self) -> str:
+        return json.dumps(sorted(self._entries))
@@ -1,12 +1,13 @@
 import asyncio
 import datetime
+import io
 import json
 import logging
 import math
 import os
 import platform
 import sys
-from typing import Literal, Optional
+from typing import Any, Dict, Literal, Optional
 
 import cpuinfo
 import discord
@@ -16,6 +17,8 @@ from discord.ext import commands
 
 from ...utils import shell
 from .. import utils
+from ..auto_defer import COMMAND_LATENCY, AutoDefer
+from ..metrics import REGISTRY
 from ..utils import MessageReaction, owner_only
 
 logger = logging.getLogger(__name__)
@@ -25,8 +28,16 @@ RESTART_FILE = os.path.expanduser("~/.bot_restarted")
 class AdminCog(commands.Cog, name="Admin"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._host_facts: Optional[asyncio.Task] = None
         super().__init__()
 
+    async def cog_load(self) -> None:
+        self.invalidate_host_facts()
+
+    async def cog_unload(self) -> None:
+        if self._host_facts is not None:
+            self._host_facts.cancel()
+
     @commands.Cog.listener()
     async def on_ready(self):
         if os.path.exists(RESTART_FILE):
@@ -89,6 +100,7 @@ class AdminCog(commands.Cog, name="Admin"):
         await interaction.response.defer()
         try:
             await self.bot.reload_extension(cog_name)
+            self.invalidate_host_facts_after_reload()
             await interaction.followup.send(content=f"{cog_name} reloaded")
         except Exception as e:
             await interaction.followup.send(content=f"Error when reloading {cog_name}: {e}")
@@ -109,6 +121,7 @@ class AdminCog(commands.Cog, name="Admin"):
             except Exception as e:
                 await interaction.followup.send(content=f"Error when reloading {cog}: {e}")
                 return
+        self.invalidate_host_facts_after_reload()
         cogs_list = '", "'.join(cogs)
         await interaction.followup.send(content=f'Successfully reloaded {len(cogs)} cogs: "{cogs_list}"')
 
@@ -148,29 +161,34 @@ class AdminCog(commands.Cog, name="Admin"):
         data = await get_cpu_info_json()
         return json.loads(data, object_hook=_utf_to_str)
 
-    @app_commands.command()
-    @app_commands.guild_only()
-    async def botstatus(self, interaction: discord.Interaction):
-        load1, load5, load15 = psutil.getloadavg()
-        virt_mem = psutil.virtual_memory()
-        disk_usage = psutil.disk_usage(os.path.abspath("."))
+    def invalidate_host_facts(self) -> None:
+        """Start collecting host facts again, e.g. after a reload may have changed the bot's version.
+
+        A collection that is already running is left to finish, since a /botstatus call may be waiting on it.
+        """
+        self._host_facts = asyncio.create_task(self.collect_host_facts())
 
-        creation_time = psutil.Process(os.getpid()).create_time()
-        boot_time = psutil.boot_time()
-        unix_timestamp = (datetime.datetime.utcnow() - datetime.datetime(1970, 1, 1)).total_seconds()
-        uptime = math.floor(unix_timestamp - creation_time)
-        system_uptime = math.floor(unix_timestamp - boot_time)
+    def invalidate_host_facts_after_reload(self) -> None:
+        # If this cog was the one reloaded, its replacement already collected fresh facts on load
+        if self.bot.get_cog(self.qualified_name) is self:
+            self.invalidate_host_facts()
+
+    async def get_host_facts(self) -> Dict[str, Any]:
+        if self._host_facts is None or self._host_facts.cancelled():
+            self.invalidate_host_facts()
+        host_facts = self._host_facts
+        try:
+            return await asyncio.shield(host_facts)
+        except Exception:
+            # Don't keep serving a failed probe, try again next time. It may already have been replaced though.
+            if self._host_facts is host_facts:
+                self._host_facts = None
+            raise
 
+    async def collect_host_facts(self) -> Dict[str, Any]:
         cpu_info = await self.run_cpuinfo()
         soc = cpu_info.get("hardware_raw")
         cpu_name = cpu_info.get("brand_raw")
-        display_cpu_name = f"{soc} ({cpu_name})" if soc else cpu_name
-        architecture = platform.uname().machine
-        python_ver = cpu_info.get("python_version")
-        clock_speed = cpu_info.get("hz_actual_friendly")
-
-        core_count = psutil.cpu_count(False)
-        thread_count = psutil.cpu_count()
 
         if platform.system() == "Windows":
             output = await shell.run_shell(
@@ -185,28 +203,89 @@ class AdminCog(commands.Cog, name="Admin"):
             os_build = uname.version
 
         git_versions = await shell.get_git_versions()
-        git_version_str = "\n".join([f"{item[0]}: `{item[1]}`" for item in git_versions.items()])
-
-        embed = discord.Embed(title="Bot status")
-        embed.add_field(name="Hostname", value=platform.node())
-        embed.add_field(name="OS", value=f"{os_name}")
-        embed.add_field(name="OS build", value=os_build)
-        embed.add_field(
-            name="CPU",
-            value=f"{display_cpu_name} ({architecture}, {clock_speed}, {core_count} cores, {thread_count} threads)",
-        )
-        embed.add_field(name="CPU usage", value=f"Load average (1/5/15 min):\n{load1}, {load5}, {load15}")
-        embed.add_field(name="Memory usage", value=f"{virt_mem[3]/(1024 ** 2):.2f}/{virt_mem[0]/(1024 ** 2):.2f} MB")
-        embed.add_field(
-            name="Disk usage", value=f"{disk_usage.used/(1024 ** 3):.2f}/{disk_usage.total/(1024 ** 3):.2f} GB"
-        )
-        embed.add_field(name="Python version", value=python_ver)
-        embed.add_field(name="Discord.py version", value=discord.__version__)
-        embed.add_field(name="Bot version", value=git_version_str)
-        embed.add_field(name="Bot uptime", value=str(datetime.timedelta(seconds=uptime)))
-        embed.add_field(name="System uptime", value=str(datetime.timedelta(seconds=system_uptime)))
-
-        await interaction.response.send_message(embed=embed)
+
+        return {
+            "hostname": platform.node(),
+            "cpu_name": f"{soc} ({cpu_name})" if soc else cpu_name,
+            "architecture": platform.uname().machine,
+            "python_version": cpu_info.get("python_version"),
+            "clock_speed": cpu_info.get("hz_actual_friendly"),
+            "core_count": psutil.cpu_count(False),
+            "thread_count": psutil.cpu_count(),
+            "os_name": os_name,
+            "os_build": os_build,
+            "git_versions": "\n".join([f"{item[0]}: `{item[1]}`" for item in git_versions.items()]),
+        }
+
+    @app_commands.command(name="metrics", description="Dump the bot's metrics in Prometheus text format")
+    @owner_only()
+    async def metrics(self, interaction: discord.Interaction, name_prefix: Optional[str] = None):
+        lines = REGISTRY.render().splitlines()
+        if name_prefix:
+            # Comment lines are "# HELP <name> ..." / "# TYPE <name> ...", samples start with the name
+            lines = [
+                line for line in lines if line.split(" ")[2 if line.startswith("#") else 0].startswith(name_prefix)
+            ]
+        text = "\n".join(lines)
+
+        if len(text) <= 1900:
+            await interaction.response.send_message(content=f"```\n{text or 'No metrics'}\n```", ephemeral=True)
+        else:
+            metrics_file = discord.File(io.BytesIO(text.encode("utf-8")), filename="metrics.txt")
+            await interaction.response.send_message(file=metrics_file, ephemeral=True)
+
+    @app_commands.command(name="latency", description="Show how long commands take to first respond")
+    @owner_only()
+    async def latency(self, interaction: discord.Interaction):
+        lines = []
+        for command in COMMAND_LATENCY.commands():
+            p50, p95, p99 = COMMAND_LATENCY.percentiles(command)
+            lines.append(
+                f"`{command}`: p50 {p50 * 1000:.0f}ms, p95 {p95 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms "
+                f"({len(COMMAND_LATENCY.samples[command])} samples, {COMMAND_LATENCY.deferred[command]} deferred)"
+            )
+        await interaction.response.send_message(content="\n".join(lines) or "No commands timed yet", ephemeral=True)
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    async def botstatus(self, interaction: discord.Interaction):
+        # The first call after a (re)load waits on cpuinfo in a subprocess, which can take seconds
+        async with AutoDefer(interaction, "botstatus") as responder:
+            facts = await self.get_host_facts()
+
+            load1, load5, load15 = psutil.getloadavg()
+            virt_mem = psutil.virtual_memory()
+            disk_usage = psutil.disk_usage(os.path.abspath("."))
+
+            creation_time = psutil.Process(os.getpid()).create_time()
+            boot_time = psutil.boot_time()
+            unix_timestamp = (datetime.datetime.utcnow() - datetime.datetime(1970, 1, 1)).total_seconds()
+            uptime = math.floor(unix_timestamp - creation_time)
+            system_uptime = math.floor(unix_timestamp - boot_time)
+
+            embed = discord.Embed(title="Bot status")
+            embed.add_field(name="Hostname", value=facts["hostname"])
+            embed.add_field(name="OS", value=f"{facts['os_name']}")
+            embed.add_field(name="OS build", value=facts["os_build"])
+            embed.add_field(
+                name="CPU",
+                value=f"{facts['cpu_name']} ({facts['architecture']}, {facts['clock_speed']}, "
+                f"{facts['core_count']} cores, {facts['thread_count']} threads)",
+            )
+            embed.add_field(name="CPU usage", value=f"Load average (1/5/15 min):\n{load1}, {load5}, {load15}")
+            embed.add_field(
+                name="Memory usage", value=f"{virt_mem[3]/(1024 ** 2):.2f}/{virt_mem[0]/(1024 ** 2):.2f} MB"
+            )
+            embed.add_field(
+                name="Disk usage", value=f"{disk_usage.used/(1024 ** 3):.2f}/{disk_usage.total/(1024 ** 3):.2f} GB"
+            )
+            embed.add_field(name="Python version", value=facts["python_version"])
+            embed.add_field(name="Discord.py version", value=discord.__version__)
+            embed.add_field(name="Bot version", value=facts["git_versions"])
+            embed.add_field(name="Bot uptime", value=str(datetime.timedelta(seconds=uptime)))
+            embed.add_field(name="System uptime", value=str(datetime.timedelta(seconds=system_uptime)))
+
+            await responder.send(embed=embed)
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -1,12 +1,15 @@
+import functools
 import io
 import logging
+from typing import List
 
 import discord
 from discord import Colour, app_commands
 from discord.ext import commands
 from mmbn.gamedata.chip import Chip, Code
-from mmbn.gamedata.navicust_part import COLORS, ColorLiteral, NaviCustColors
-from mrprog.bot.supported_games import SupportedGameLiteral, CHIP_LISTS, NCP_LISTS
+from mmbn.gamedata.navicust_part import COLORS, ColorLiteral, NaviCustColors, NaviCustPart
+from mrprog.bot.item_index import chip_index, game_data_index, ncp_index
+from mrprog.bot.supported_games import SupportedGameLiteral
 
 from mrprog.bot.utils import Emotes
 
@@ -15,6 +18,58 @@ from .. import autocomplete
 logger = logging.getLogger(__name__)
 
 
+# The embeds below only depend on static game data, so they're built once and reused. Attachments can't be cached
+# since discord.File is consumed when sent.
+@functools.lru_cache(maxsize=None)
+def _make_chipcode_embed(game: int, chip_code: Code) -> discord.Embed:
+    code_name = chip_code.name if chip_code != Code.Star else "*"
+    return discord.Embed(
+        title=f"BN{game} chips in {code_name.upper()} code",
+        color=Colour.gold(),
+        description=", ".join([chip.name for chip in game_data_index(game).chips_by_code.get(chip_code, [])]),
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _make_chip_embed(game: int, chip_name: str) -> discord.Embed:
+    chips = game_data_index(game).get_chips_by_name(chip_name)
+    chip = chips[0]
+    embed = discord.Embed(title=f"{chip.name} (BN{game})")
+
+    embed.add_field(name="Description", value=chip.description, inline=False)
+    embed.add_field(name="ID", value=chip.chip_id)
+    embed.add_field(name="Codes", value=", ".join(c.code.name if c.code != Code.Star else "*" for c in chips))
+    embed.add_field(
+        name="Type", value={Chip.STANDARD: "Standard", Chip.MEGA: "Mega", Chip.GIGA: "Giga"}[chip.chip_type]
+    )
+    embed.add_field(name="Attack", value=chip.atk if chip.atk > 1 else "???" if chip.atk == 1 else "---")
+    embed.add_field(name="Element", value=chip.element.name)
+    embed.add_field(name="MB", value=f"{chip.mb} MB")
+    return embed
+
+
+@functools.lru_cache(maxsize=1024)
+def _make_ncp_embed(game: int, part_name: str) -> discord.Embed:
+    parts: List[NaviCustPart] = game_data_index(game).get_parts_by_name(part_name)
+    part = parts[0]
+    embed = discord.Embed(title=f"{part.name} (BN{game})")
+    embed.set_image(url="attachment://ncp.png")
+    embed.add_field(name="Description", value=part.description, inline=False)
+    embed.add_field(name="Colors", value=" ".join(p.color.value for p in parts))
+    embed.add_field(name="Compression code", value=part.compression_code if part.compression_code else "None")
+    embed.add_field(name="Bug", value=part.bug.value, inline=False)
+    return embed
+
+
+@functools.lru_cache(maxsize=None)
+def _make_ncpcolor_embed(game: int, color: NaviCustColors) -> discord.Embed:
+    return discord.Embed(
+        title=f"{color.value} BN{game} {color.name} NaviCust parts",
+        color=Colour.from_rgb(*COLORS[color.name]),
+        description="\n".join(part.name for part in game_data_index(game).get_parts_by_color(color.name)),
+    )
+
+
 class InfoCog(commands.Cog, name="Info"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -35,41 +90,27 @@ class InfoCog(commands.Cog, name="Info"):
             await interaction.response.send_message(f"{Emotes.ERROR} That code isn't valid.", ephemeral=True)
             return
 
-        matching_chips = []
-        for chip in CHIP_LISTS[game].all_chips:
-            if chip.code == actual_chip_code:
-                matching_chips.append(chip)
-
-        embed = discord.Embed(
-            title=f"BN{game} chips in {chip_code.upper()} code",
-            color=Colour.gold(),
-            description=", ".join([chip.name for chip in matching_chips]),
-        )
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=_make_chipcode_embed(game, actual_chip_code))
 
     @app_commands.command(description="Describes a chip in the chosen game.")
     @app_commands.autocomplete(chip_name=autocomplete.chip_autocomplete)
     async def chip(self, interaction: discord.Interaction, game: SupportedGameLiteral, chip_name: str):
-        chips = CHIP_LISTS[game].get_chips_by_name(chip_name)
+        index = game_data_index(game)
+        chips = index.get_chips_by_name(chip_name)
+        if len(chips) == 0:
+            closest_name = chip_index(game).best_match(chip_name)
+            if closest_name is not None:
+                chips = index.get_chips_by_name(closest_name)
         if len(chips) == 0:
             await interaction.response.send_message(f"{Emotes.ERROR} That chip doesn't exist.", ephemeral=True)
             return
 
         chip = chips[0]
-        embed = discord.Embed(title=f"{chip.name} (BN{game})")
-
-        embed.add_field(name="Description", value=chip.description, inline=False)
-        embed.add_field(name="ID", value=chip.chip_id)
-        embed.add_field(name="Codes", value=", ".join(c.code.name if c.code != Code.Star else "*" for c in chips))
-        embed.add_field(
-            name="Type", value={Chip.STANDARD: "Standard", Chip.MEGA: "Mega", Chip.GIGA: "Giga"}[chip.chip_type]
-        )
-        embed.add_field(name="Attack", value=chip.atk if chip.atk > 1 else "???" if chip.atk == 1 else "---")
-        embed.add_field(name="Element", value=chip.element.name)
-        embed.add_field(name="MB", value=f"{chip.mb} MB")
+        embed = _make_chip_embed(game, chip.name.lower())
 
         try:
             image = discord.File(chip.chip_image_path, filename="chip.png")
+            embed = embed.copy()
             embed.set_image(url="attachment://chip.png")
             await interaction.response.send_message(embed=embed, file=image)
         except NotImplementedError:
@@ -78,7 +119,12 @@ class InfoCog(commands.Cog, name="Info"):
     @app_commands.command(name="ncp", description="Describes a NaviCust part in the chosen game.")
     @app_commands.autocomplete(part_name=autocomplete.ncp_autocomplete)
     async def ncp(self, interaction: discord.Interaction, game: SupportedGameLiteral, part_name: str):
-        parts = NCP_LISTS[game].get_parts_by_name(part_name)
+        index = game_data_index(game)
+        parts = index.get_parts_by_name(part_name)
+        if len(parts) == 0:
+            closest_name = ncp_index(game).best_match(part_name)
+            if closest_name is not None:
+                parts = index.get_parts_by_name(closest_name)
         if len(parts) == 0:
             await interaction.response.send_message(f"{Emotes.ERROR} That part doesn't exist.", ephemeral=True)
             return
@@ -88,30 +134,13 @@ class InfoCog(commands.Cog, name="Info"):
             img.write(part.block_image)
             img.seek(0)
             image = discord.File(img, filename="ncp.png")
-        embed = discord.Embed(title=f"{part.name} (BN{game})")
-        embed.set_image(url="attachment://ncp.png")
-        embed.add_field(name="Description", value=part.description, inline=False)
-        embed.add_field(name="Colors", value=" ".join(p.color.value for p in parts))
-        embed.add_field(name="Compression code", value=part.compression_code if part.compression_code else "None")
-        embed.add_field(name="Bug", value=part.bug.value, inline=False)
 
-        await interaction.response.send_message(embed=embed, file=image)
+        await interaction.response.send_message(embed=_make_ncp_embed(game, part.name.lower()), file=image)
 
     @app_commands.command(description="Lists all NaviCust parts of the same color in the chosen game.")
     async def ncpcolor(self, interaction: discord.Interaction, game: SupportedGameLiteral, color: ColorLiteral):
         actual_color = NaviCustColors[color]
-
-        text = []
-        for part in NCP_LISTS[game].all_parts:
-            if part.color == actual_color:
-                text.append(part.name)
-
-        embed = discord.Embed(
-            title=f"{actual_color.value} BN{game} {actual_color.name} NaviCust parts",
-            color=Colour.from_rgb(*COLORS[actual_color.name]),
-            description="\n".join(text),
-        )
-        await interaction.response.send_message(embed=embed)
+        await interaction.response.send_message(embed=_make_ncpcolor_embed(game, actual_color))
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -1,21 +1,35 @@
 import io
-import pkgutil
+from typing import Optional
 
 import discord
 from discord import app_commands
 from discord.app_commands import Choice
 from discord.ext import commands
 
+from mrprog.bot.save_templates import SAVE_TEMPLATES, SaveTemplateStore, load_templates
 from mrprog.bot.utils import Emotes
 
+ALL_SAVES = "all"
+
 
 class SaveCog(commands.Cog, name="Save"):
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.templates: Optional[SaveTemplateStore] = None
+        super().__init__()
+
+    async def cog_load(self) -> None:
+        self.templates = load_templates()
+
+    async def cog_unload(self) -> None:
+        self.templates.close()
+
     @app_commands.command(name="save", description="Request a save for the Steam version of BNLC")
     @app_commands.guild_only()
-    @app_commands.choices(game=[
-        Choice(name="Battle Network 6 Falzar", value="exe6f"),
-        Choice(name="Battle Network 6 Gregar", value="exe6g")
-    ])
+    @app_commands.choices(
+        game=[Choice(name=spec.title, value=spec.name) for spec in SAVE_TEMPLATES.values()]
+        + [Choice(name="All of the above", value=ALL_SAVES)]
+    )
     async def request_save(
         self,
         interaction: discord.Interaction,
@@ -27,32 +41,24 @@ class SaveCog(commands.Cog, name="Save"):
         except ValueError:
             await interaction.response.send_message(content=f"{Emotes.ERROR} Invalid steam ID.", ephemeral=True)
             return
-        steam_id_bytes = steamid_32.to_bytes(4, "little")
-
-        encrypted = pkgutil.get_data("mrprog.bot", f"saves/{game.value}_save_0.bin")
-        xor_byte = encrypted[1]
-        decrypted = self.array_xor(encrypted, xor_byte)
-
-        for i, b in enumerate(steam_id_bytes):
-            decrypted[6496 + i] = b
 
-        encrypted_updated = self.array_xor(decrypted, xor_byte)
+        names = list(self.templates.templates) if game.value == ALL_SAVES else [game.value]
+        # Discord allows at most 10 attachments per message
+        names = names[:10]
 
-        with io.BytesIO() as save_file:
-            save_file.write(encrypted_updated)
-            save_file.seek(0)
-            save_upload = discord.File(save_file, filename=f"{game.value}_save_0.bin")
+        save_uploads = []
+        for name in names:
+            template = self.templates[name]
+            save = self.templates.get_save(name, steamid_32)
+            save_uploads.append(discord.File(io.BytesIO(save), filename=template.filename))
 
+        paths = "\n".join(
+            fr"`C:\Program Files (x86)\Steam\userdata\{steamid_32}\1798020\remote\{self.templates[name].filename}`"
+            for name in names
+        )
         await interaction.response.send_message(
-            content=fr"Copy this file to `C:\Program Files (x86)\Steam\userdata\{steamid_32}\1798020\remote\{game.value}_save_0.bin`."
-                    f"\n**MAKE SURE TO MAKE A BACKUP FIRST!**", file=save_upload, ephemeral=True)
-
-    @staticmethod
-    def array_xor(b1, xor):
-        result = bytearray(b1)
-        for i in range(len(b1)):
-            result[i] ^= xor
-        return result
+            content=f"Copy {'this file' if len(names) == 1 else 'these files'} to:\n{paths}"
+                    f"\n**MAKE SURE TO MAKE A BACKUP FIRST!**", files=save_uploads, ephemeral=True)
 
 
 async def setup(bot: commands.Bot) -> None:
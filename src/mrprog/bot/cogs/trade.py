@@ -1,12 +1,10 @@
 import asyncio
 import atexit
-import collections
 import io
 import json
 import logging
-import re
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import List, Optional
 
 import discord
 from discord import app_commands
@@ -28,8 +26,15 @@ from mrprog.utils.trade import TradeRequest
 from mrprog.utils.types import TradeItem
 
 from mrprog.bot import autocomplete
+from mrprog.bot.auto_defer import AutoDefer
 from mrprog.bot.rpc_client import TradeRequestRpcClient, TradeResponse
 from mrprog.bot.stats.trade_stats import BotTradeStats
+from mrprog.bot.stats.trade_store import TradeStatsStore
+from mrprog.bot.stats.trade_windows import TradeWindowStats, WindowLiteral
+from mrprog.bot.status_renderer import StatusRenderer
+from mrprog.bot.trade_eta import format_eta
+from mrprog.bot.worker_history import format_seconds
+from mrprog.bot.worker_registry import WorkerRecord
 from mrprog.bot.utils import Emotes, owner_only
 
 logger = logging.getLogger(__name__)
@@ -47,13 +52,15 @@ class TradeCog(commands.Cog, name="Trade"):
         self.bot = bot
 
         self.trade_request_rpc_client: TradeRequestRpcClient
-        self.bot_stats = None
+        self.bot_stats: Optional[BotTradeStats] = None
+        self.stats_store = TradeStatsStore("bot_stats.db", legacy_pickle_path="bot_stats.pkl")
+        self.window_stats = TradeWindowStats()
 
         self.channel_ids = set()
         self.queue_message = None
         self.worker_message = None
 
-        self.time_since_last_update = 0
+        self.status_renderer = StatusRenderer(bot)
 
     @tasks.loop(seconds=180)
     async def change_status(self):
@@ -70,30 +77,13 @@ class TradeCog(commands.Cog, name="Trade"):
             import traceback
             traceback.print_exc()
 
-    @tasks.loop(seconds=1)
-    async def update_queue_and_worker_status(self):
-        try:
-            t = time.time()
-            if self.bot.is_ready():
-                if self.trade_request_rpc_client.queue_modified and not self.bot.is_ws_ratelimited() and (t - self.time_since_last_update > 1):
-                    embed = self._make_queue_embed()
-                    await self.queue_message.edit(content="", embed=embed)
-                    self.trade_request_rpc_client.queue_modified = False
-                    self.time_since_last_update = t
-
-                if self.trade_request_rpc_client.worker_status_modified and not self.bot.is_ws_ratelimited() and (t - self.time_since_last_update > 1):
-                    embed = self._make_worker_embed(user_requested=False)
-                    await self.worker_message.edit(content="", embed=embed)
-                    self.trade_request_rpc_client.worker_status_modified = False
-                    self.time_since_last_update = t
-        except Exception:
-            import traceback
-            traceback.print_exc()
-
     async def cog_load(self) -> None:
-        self.bot_stats = BotTradeStats.load_or_default("bot_stats.pkl")
+        self.bot_stats = await self.stats_store.load()
+        for timestamp, system, game, trade_item in await self.stats_store.load_recent_trades(
+            time.time() - self.window_stats.max_age
+        ):
+            self.window_stats.add_trade(trade_item, system, game, timestamp)
         self.change_status.start()
-        self.update_queue_and_worker_status.start()
 
         self.trade_request_rpc_client = TradeRequestRpcClient(
             "bn-orchestrator", "worker", "worker", self.message_room_code, self.handle_trade_update
@@ -133,20 +123,38 @@ class TradeCog(commands.Cog, name="Trade"):
             config["worker_message_id"] = str(self.worker_message.id)
             await self.trade_request_rpc_client.publish_retained_message("bot/config", json.dumps(config))
 
+        self.status_renderer.add_target("queue", self.queue_message, self._make_queue_embed, initial_embed=queue_embed)
+        self.status_renderer.add_target(
+            "workers", self.worker_message, self._make_worker_embed, initial_embed=worker_embed
+        )
+        self.trade_request_rpc_client.add_change_listener(
+            TradeRequestRpcClient.QUEUE_CHANGED, self._notify_queue_changed
+        )
+        self.trade_request_rpc_client.add_change_listener(
+            TradeRequestRpcClient.WORKERS_CHANGED, self._notify_workers_changed
+        )
+
         atexit.register(self.atexit_func)
         logger.debug("Trade cog successfully loaded")
 
     async def cog_unload(self) -> None:
         atexit.unregister(self.atexit_func)
         self.change_status.stop()
-        self.update_queue.stop()
-        self.update_workers.stop()
+        await self.status_renderer.stop()
         await self.trade_request_rpc_client.disconnect()
-        self.bot_stats.save("bot_stats.pkl")
+        await self.stats_store.snapshot(self.bot_stats)
+        self.stats_store.close()
+
+    def _notify_queue_changed(self) -> None:
+        self.status_renderer.notify("queue")
+
+    def _notify_workers_changed(self) -> None:
+        self.status_renderer.notify("workers")
 
     def atexit_func(self) -> None:
         asyncio.run(self.trade_request_rpc_client.disconnect())
-        self.bot_stats.save("bot_stats.pkl")
+        # Every trade is already committed as it happens, so just wait for any pending writes
+        self.stats_store.close()
 
     async def cog_app_command_error(self, interaction: discord.Interaction, error: AppCommandError):
         import traceback
@@ -154,89 +162,84 @@ class TradeCog(commands.Cog, name="Trade"):
         logger.exception("\n".join(traceback.format_exception(error)))
 
     def _make_queue_embed(self, requested_user: Optional[discord.User] = None) -> discord.Embed:
-        queued: List[Tuple[int, TradeRequest]]
-        in_progress: List[Tuple[str, TradeRequest]]
-        queued, in_progress, _ = self.trade_request_rpc_client.get_current_queue()
+        rpc_client = self.trade_request_rpc_client
+        queue = rpc_client.cached_queue
+        embed = discord.Embed(title=f"Current queue ({len(queue)})")
 
-        fields: Dict[Tuple[str, int], List[Tuple[int, int, int, TradeItem]]] = collections.defaultdict(list)
-        for correlation_id, request in queued:
-            trades = fields[(request.system, request.game)]
-            count = len(trades)
-
-            if count >= 20:
-                continue
-
-            trades.append((request.priority, count, request.user_id, request.trade_item))
-
-        embed = discord.Embed(title=f"Current queue ({len(queued)})")
+        requested_position = None
+        if requested_user is not None:
+            requested_position = queue.user_position(requested_user.id)
+
+        requested_eta = None
+        for system, game in queue.game_keys():
+            trades = queue.bucket(system, game, limit=20)
+            eta_count = len(trades)
+            if requested_position is not None and requested_position[0] == (system, game):
+                eta_count = max(eta_count, requested_position[1] + 1)
+            etas = self._get_queue_etas(system, game, eta_count)
+            if requested_position is not None and requested_position[0] == (system, game) and etas is not None:
+                requested_eta = etas[requested_position[1]]
 
-        for (system, game), trades in sorted(fields.items(), key=lambda kv: kv[0]):
-            trades_sorted = sorted(trades, key=lambda trade: (trade[0], trade[1]))
             lines = []
-            for position, (priority, _, user_id, trade_item) in enumerate(trades_sorted):
-                if priority > 0:
-                    lines.append(f"{position}. <@{user_id}> - `{trade_item}` (priority {priority})")
-                else:
-                    lines.append(f"{position}. <@{user_id}> - `{trade_item}`")
+            for position, (_, request) in enumerate(trades):
+                line = f"{position}. <@{request.user_id}> - `{request.trade_item}`"
+                if request.priority > 0:
+                    line += f" (priority {request.priority})"
+                if etas is not None:
+                    line += f" - {format_eta(etas[position])}"
+                lines.append(line)
             system_emote = Emotes.STEAM if system == "steam" else Emotes.SWITCH
             embed.add_field(name=f"{system_emote} BN{game} ({len(lines)})", value="\n".join(lines))
 
-        if requested_user is not None:
-            for idx, (user_id, response) in enumerate(queued):
-                if requested_user.id == user_id:
-                    embed.set_footer(
-                        text=f"Your position in the queue is {idx + 1}", icon_url=requested_user.display_avatar.url
-                    )
-                    break
+        footer = None
+        if requested_position is not None:
+            footer = f"Your position in the queue is {requested_position[1] + 1}"
+            if not rpc_client.is_bot_enabled():
+                footer += ", trading is currently paused"
+            elif requested_eta is not None:
+                footer += f", expected wait {format_eta(requested_eta)}"
             else:
-                for idx, (user_id, response) in enumerate(in_progress):
-                    if requested_user.id == user_id:
-                        embed.set_footer(text="Your trade is in progress", icon_url=requested_user.display_avatar.url)
-                        break
+                footer += ", no workers are currently online for this game"
+        elif requested_user is not None and rpc_client.is_in_progress(requested_user.id):
+            footer = "Your trade is in progress"
+        if footer is not None:
+            embed.set_footer(text=footer, icon_url=requested_user.display_avatar.url)
 
         return embed
 
-    def _make_worker_embed(self, user_requested: bool = False) -> discord.Embed:
-        in_progress: List[Tuple[str, TradeRequest]]
-
-        msgs = self.trade_request_rpc_client.cached_messages
-        _, in_progress, _ = self.trade_request_rpc_client.get_current_queue()
-        worker_to_trade_map: Dict[str, TradeRequest] = {worker_id: request for worker_id, request in in_progress}
+    def _get_queue_etas(self, system: str, game: int, count: int) -> Optional[List[float]]:
+        rpc_client = self.trade_request_rpc_client
+        if not rpc_client.is_bot_enabled():
+            return None
+        return rpc_client.trade_eta.queue_etas(system, game, rpc_client.get_live_workers(system, game), count)
 
+    def _make_worker_embed(self, user_requested: bool = False) -> discord.Embed:
+        now = time.time()
         lines = []
-        for key in msgs.keys():
-            match = re.match(r"worker/([A-Za-z0-9_-]+)/available", key)
-            if match:
-                worker_id = match.group(1)
-                worker_hostname = msgs[f"worker/{worker_id}/hostname"].decode("utf-8")
-                worker_system = (
-                    Emotes.STEAM if msgs[f"worker/{worker_id}/system"].decode("utf-8") == "steam" else Emotes.SWITCH
-                )
-                worker_game = msgs[f"worker/{worker_id}/game"].decode("utf-8")
-                worker_enabled = msgs.get(f"worker/{worker_id}/enabled") == b"1"
-                worker_available = msgs[key] == b"1"
-
-                if worker_enabled and worker_available:
-                    if worker_id in worker_to_trade_map:
-                        trade = worker_to_trade_map[worker_id]
-                        status = f"trading: <@{trade.user_id}> - `{trade.trade_item}`"
-                    else:
-                        status = "idle"
-                    emote = Emotes.OK
-                elif worker_available and not worker_enabled:
-                    emote = Emotes.WARNING
-                    status = "disabled"
+        for worker in self.trade_request_rpc_client.workers.listed():
+            worker_system = Emotes.STEAM if worker.system == "steam" else Emotes.SWITCH
+            if worker.state == WorkerRecord.ONLINE and worker.stale:
+                emote = Emotes.WARNING
+                status = f"stale, last seen {format_eta(worker.lag(now))} ago"
+            elif worker.state == WorkerRecord.ONLINE:
+                if worker.current_trade is not None:
+                    status = f"trading: <@{worker.current_trade.user_id}> - `{worker.current_trade.trade_item}`"
                 else:
-                    emote = Emotes.ERROR
-                    status = "offline"
-                lines.append(
-                    f"{emote} {worker_hostname} ({worker_id[:8]}) - {worker_system} BN{worker_game} ({status})"
-                )
+                    status = "idle"
+                emote = Emotes.OK
+            elif worker.state == WorkerRecord.DISABLED:
+                emote = Emotes.WARNING
+                status = "disabled"
+            else:
+                emote = Emotes.ERROR
+                status = "offline"
+            lines.append(
+                f"{emote} {worker.hostname} ({worker.worker_id[:8]}) - {worker_system} BN{worker.game} ({status})"
+            )
 
         worker_count = len(lines)
-        global_enable = msgs.get("bot/enabled", b"0") == b"1"
         lines.append("")
-        if global_enable:
+        if self.trade_request_rpc_client.is_bot_enabled():
             lines.append(f"{Emotes.OK} trades currently being processed")
         else:
             lines.append(f"{Emotes.ERROR} trades currently not being processed")
@@ -271,8 +274,12 @@ class TradeCog(commands.Cog, name="Trade"):
                 await discord_channel.send(content=content, embed=embed, file=img)
 
             if trade_response.status == TradeResponse.SUCCESS:
-                self.bot_stats.add_trade(trade_response.request.user_id, trade_response.request.trade_item)
-                self.bot_stats.save("bot_stats.pkl")
+                request = trade_response.request
+                self.bot_stats.add_trade(request.user_id, request.trade_item)
+                self.stats_store.record_trade(request.user_id, request.trade_item, request.system, request.game)
+                self.window_stats.add_trade(request.trade_item, request.system, request.game)
+                if self.stats_store.snapshot_due():
+                    await self.stats_store.snapshot(self.bot_stats)
         except Exception:
             import traceback
 
@@ -364,22 +371,22 @@ class TradeCog(commands.Cog, name="Trade"):
             )
             return
 
-        messages = self.trade_request_rpc_client.cached_messages
-        if messages.get(f"game/{system.lower()}/{game}/enabled", "0") == "0":
-            await interaction.response.send_message(
-                f"{Emotes.ERROR} Trading is currently disabled for this game on this platform."
-            )
-            return
+        # Validation errors are private, which a public deferral would undo, so only the replies below go through it
+        async with AutoDefer(interaction, "request chip") as responder:
+            messages = self.trade_request_rpc_client.cached_messages
+            if messages.get(f"game/{system.lower()}/{game}/enabled", "0") == "0":
+                await responder.send(f"{Emotes.ERROR} Trading is currently disabled for this game on this platform.")
+                return
 
-        existing = await self.request(interaction, user, system, game, chip, priority, is_admin)
-        if existing is None:
-            await interaction.response.send_message(
-                f"{Emotes.OK} Your request for `{chip}` has been added to the queue."
-            )
-        else:
-            await interaction.response.send_message(
-                f"{Emotes.ERROR} You are already in queue for `{existing.trade_item}`"
-            )
+            try:
+                existing = await self.request(interaction, user, system, game, chip, priority, is_admin)
+            except Exception:
+                await responder.send(f"{Emotes.ERROR} Your request for `{chip}` couldn't be queued, please try again.")
+                return
+            if existing is None:
+                await responder.send(f"{Emotes.OK} Your request for `{chip}` has been added to the queue.")
+            else:
+                await responder.send(f"{Emotes.ERROR} You are already in queue for `{existing.trade_item}`")
 
     @request_group.command(name="ncp", description="Request a NaviCust part")
     @app_commands.autocomplete(
@@ -448,22 +455,22 @@ class TradeCog(commands.Cog, name="Trade"):
             )
             return
 
-        messages = self.trade_request_rpc_client.cached_messages
-        if messages.get(f"game/{system.lower()}/{game}/enabled", "0") == "0":
-            await interaction.response.send_message(
-                f"{Emotes.ERROR} Trading is currently disabled for this game on this platform."
-            )
-            return
+        # Validation errors are private, which a public deferral would undo, so only the replies below go through it
+        async with AutoDefer(interaction, "request ncp") as responder:
+            messages = self.trade_request_rpc_client.cached_messages
+            if messages.get(f"game/{system.lower()}/{game}/enabled", "0") == "0":
+                await responder.send(f"{Emotes.ERROR} Trading is currently disabled for this game on this platform.")
+                return
 
-        existing = await self.request(interaction, user, system, game, ncp, priority, is_admin)
-        if existing is None:
-            await interaction.response.send_message(
-                f"{Emotes.OK} Your request for `{ncp}` has been added to the queue."
-            )
-        else:
-            await interaction.response.send_message(
-                f"{Emotes.ERROR} You are already in queue for {existing.trade_item}"
-            )
+            try:
+                existing = await self.request(interaction, user, system, game, ncp, priority, is_admin)
+            except Exception:
+                await responder.send(f"{Emotes.ERROR} Your request for `{ncp}` couldn't be queued, please try again.")
+                return
+            if existing is None:
+                await responder.send(f"{Emotes.OK} Your request for `{ncp}` has been added to the queue.")
+            else:
+                await responder.send(f"{Emotes.ERROR} You are already in queue for {existing.trade_item}")
 
     async def request(
         self,
@@ -476,11 +483,18 @@ class TradeCog(commands.Cog, name="Trade"):
         is_admin: bool,
     ) -> Optional[TradeRequest]:
         # TODO: Block requests if the requested system/game combo is not online
-        _, _, queued_users = self.trade_request_rpc_client.get_current_queue()
-        if user.id in queued_users and not is_admin:
-            return queued_users[user.id]
+        existing = self.trade_request_rpc_client.get_queued_request(user.id)
+        if existing is not None and not is_admin:
+            return existing
         await self.trade_request_rpc_client.submit_trade_request(
-            user.display_name, user.id, interaction.channel_id, system.lower(), game, trade_item, priority
+            user.display_name,
+            user.id,
+            interaction.channel_id,
+            system.lower(),
+            game,
+            trade_item,
+            priority,
+            received_at=interaction.created_at.timestamp(),
         )
         return None
 
@@ -520,8 +534,12 @@ class TradeCog(commands.Cog, name="Trade"):
 
     @app_commands.command()
     @app_commands.guild_only()
-    async def toptrades(self, interaction: discord.Interaction):
-        top_items = self.bot_stats.get_trades_by_trade_count()
+    async def toptrades(self, interaction: discord.Interaction, window: Optional[WindowLiteral] = None):
+        if window is not None:
+            await interaction.response.send_message(embed=self._make_windowed_top_trades_embed(window))
+            return
+
+        top_items = self.bot_stats.get_trades_by_trade_count(20)
         lines = []
         count = 0
         for trade_item, qty in top_items:
@@ -548,10 +566,28 @@ class TradeCog(commands.Cog, name="Trade"):
         embed.add_field(name="Top trades", value="\n".join(lines), inline=False)
         await interaction.response.send_message(embed=embed)
 
+    def _make_windowed_top_trades_embed(self, window: WindowLiteral) -> discord.Embed:
+        lines = [
+            f"{count}. `{trade_item}` (BN{game}) x{qty}"
+            for count, ((game, trade_item), qty) in enumerate(
+                self.window_stats.get_trades_by_trade_count(window, limit=20), 1
+            )
+        ]
+        platform_lines = []
+        for (system, game), qty in self.window_stats.get_platforms_by_trade_count(window):
+            system_emote = Emotes.STEAM if system == "steam" else Emotes.SWITCH
+            platform_lines.append(f"{system_emote} BN{game} x{qty}")
+
+        embed = discord.Embed(title=f"Top trades (last {window})")
+        embed.add_field(name="Top trades", value="\n".join(lines) or "No trades", inline=False)
+        embed.add_field(name="By platform", value="\n".join(platform_lines) or "No trades", inline=False)
+        embed.set_footer(text=f"{self.window_stats.get_total_trade_count(window)} trades in the last {window}")
+        return embed
+
     @app_commands.command()
     @app_commands.guild_only()
     async def topusers(self, interaction: discord.Interaction):
-        top_users = self.bot_stats.get_users_by_trade_count()
+        top_users = self.bot_stats.get_users_by_trade_count(20)
 
         lines = []
         count = 0
@@ -563,7 +599,7 @@ class TradeCog(commands.Cog, name="Trade"):
 
         embed = discord.Embed(title="Top users by trade count")
         embed.add_field(name="Top users", value="\n".join(lines), inline=False)
-        embed.set_footer(text=f"{len(top_users)} users total")
+        embed.set_footer(text=f"{self.bot_stats.get_total_user_count()} users total")
         await interaction.response.send_message(embed=embed)
 
     @app_commands.command()
@@ -611,27 +647,26 @@ class TradeCog(commands.Cog, name="Trade"):
     @app_commands.command()
     @app_commands.guild_only()
     async def workerstatus(self, interaction: discord.Interaction, worker_id: str):
-        msgs = self.trade_request_rpc_client.cached_messages
-        _, in_progress, _ = self.trade_request_rpc_client.get_current_queue()
-
-        worker_hostname = msgs[f"worker/{worker_id}/hostname"].decode("utf-8")
-        worker_system_name = msgs[f"worker/{worker_id}/system"].decode("utf-8")
-        worker_system_emote = Emotes.STEAM if worker_system_name == "steam" else Emotes.SWITCH
-        worker_game = msgs[f"worker/{worker_id}/game"].decode("utf-8")
-        worker_enabled = bool(msgs.get(f"worker/{worker_id}/enabled") == b"1")
-        worker_available = bool(msgs[f"worker/{worker_id}/available"] == b"1")
-        worker_versions = json.loads(msgs[f"worker/{worker_id}/version"].decode("utf-8"))
-        git_version_str = "\n".join([f"{item[0]}: `{item[1]}`" for item in worker_versions.items()])
-
-        if worker_enabled and worker_available:
-            if msgs.get(f"worker/{worker_id}/current_trade"):
-                trade_request = TradeRequest.from_bytes(msgs.get(f"worker/{worker_id}/current_trade"))
+        worker = self.trade_request_rpc_client.workers.get(worker_id)
+        if worker is None or worker.state is None:
+            await interaction.response.send_message(f"{Emotes.ERROR} Unknown worker `{worker_id}`.", ephemeral=True)
+            return
+
+        worker_system_emote = Emotes.STEAM if worker.system == "steam" else Emotes.SWITCH
+        git_version_str = "\n".join([f"{item[0]}: `{item[1]}`" for item in (worker.version or {}).items()])
+
+        if worker.state == WorkerRecord.ONLINE and worker.stale:
+            status = f"Online but not responding, last seen {format_eta(worker.lag(time.time()))} ago"
+            status_emote = Emotes.WARNING
+        elif worker.state == WorkerRecord.ONLINE:
+            trade_request = worker.current_trade
+            if trade_request is not None:
                 status = f"Online, trading: <@{trade_request.user_id}> - {trade_request.trade_item}"
                 status_emote = Emotes.OK
             else:
                 status = "Online, idle"
                 status_emote = Emotes.OK
-        elif worker_available and not worker_enabled:
+        elif worker.state == WorkerRecord.DISABLED:
             status = "Online, disabled"
             status_emote = Emotes.WARNING
         else:
@@ -640,30 +675,33 @@ class TradeCog(commands.Cog, name="Trade"):
 
         embed = discord.Embed(title=f"Worker status")
         embed.add_field(name="Worker ID", value=worker_id)
-        embed.add_field(name="Hostname", value=worker_hostname)
-        embed.add_field(name="System", value=f"{worker_system_emote} {worker_system_name.capitalize()}")
-        embed.add_field(name="Game", value=f"Battle Network {worker_game}")
+        embed.add_field(name="Hostname", value=worker.hostname)
+        embed.add_field(name="System", value=f"{worker_system_emote} {worker.system.capitalize()}")
+        embed.add_field(name="Game", value=f"Battle Network {worker.game}")
         embed.add_field(name="Status", value=f"{status_emote} {status}")
-        embed.add_field(name="Version", value=git_version_str)
+        embed.add_field(name="Version", value=git_version_str or "Unknown")
+
+        summary = self.trade_request_rpc_client.worker_history.summary(worker_id)
+        if summary is not None:
+            lines = [
+                f"{summary.trades_per_hour:.0f} trades in the last hour",
+                f"{summary.success_rate:.0%} success over the last {summary.samples} trades",
+            ]
+            if summary.critical_failures:
+                lines.append(f"{summary.critical_failures} critical failures")
+            if summary.p50 is not None:
+                lines.append(f"p50 {format_seconds(summary.p50)}, p95 {format_seconds(summary.p95)}")
+            embed.add_field(name="Recent trades", value="\n".join(lines), inline=False)
 
         await interaction.response.send_message(embed=embed)
 
     @toggleworker.autocomplete("worker_id")
     @workerstatus.autocomplete("worker_id")
     async def _autocomplete_worker_name(self, interaction: discord.Interaction, current: str):
-        msgs = self.trade_request_rpc_client.cached_messages
-        workers = set()
-        for key in msgs.keys():
-            match = re.match(r"worker/([A-Za-z0-9_-]+)/available", key)
-            if match:
-                worker_id = match.group(1)
-                workers.add(worker_id)
-
-        return [
-            app_commands.Choice(name=worker_id, value=worker_id)
-            for worker_id in sorted(workers)
-            if worker_id.startswith(current)
-        ]
+        workers = self.trade_request_rpc_client.workers
+        worker_ids = [worker_id for worker_id in workers.worker_ids() if worker_id.startswith(current)]
+        # Discord rejects more than 25 choices
+        return [app_commands.Choice(name=worker_id, value=worker_id) for worker_id in worker_ids[:25]]
 
     """
     @commands.command()
@@ -732,17 +770,13 @@ class TradeCog(commands.Cog, name="Trade"):
     @app_commands.command()
     @app_commands.guild_only()
     async def cancel(self, interaction: discord.Interaction):
-        _, _, queued_by_user = self.trade_request_rpc_client.get_current_queue()
-        if interaction.user.id not in queued_by_user:
-            await interaction.response.send_message(
-                f"{Emotes.ERROR} You are not in the queue."
-            )
-            return
+        async with AutoDefer(interaction, "cancel") as responder:
+            if not self.trade_request_rpc_client.cached_queue.has_user(interaction.user.id):
+                await responder.send(f"{Emotes.ERROR} You are not in the queue.")
+                return
 
-        await self.trade_request_rpc_client.cancel_trade_request(interaction.user.id)
-        await interaction.response.send_message(
-            f"{Emotes.OK} Your request has been cancelled."
-        )
+            await self.trade_request_rpc_client.cancel_trade_request(interaction.user.id)
+            await responder.send(f"{Emotes.OK} Your request has been cancelled.")
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -0,0 +1,179 @@
+import bisect
+import collections
+import functools
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from discord import app_commands
+from mmbn.gamedata.chip import Chip, Code
+from mmbn.gamedata.navicust_part import NaviCustPart
+from mrprog.utils.types import TradeItem
+
+from mrprog.bot.supported_games import CHIP_LISTS, NCP_LISTS
+
+# Sorts after every character a prefix can continue with
+_PREFIX_END = "\U0010ffff"
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# How many trigram candidates get the (slower) edit distance check
+_FUZZY_CANDIDATES = 50
+
+
+def normalize(name: str) -> str:
+    return _NON_ALNUM.sub("", name.lower())
+
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance between ``a`` and ``b``, or ``max_distance + 1`` once it's known to exceed the bound."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class ItemNameIndex:
+    """Search index over the item names in one chip or NaviCust list.
+
+    Names are kept sorted with a prebuilt autocomplete choice each, so a prefix lookup is two binary searches plus
+    a slice of at most ``limit`` existing choices. For typos and spacing differences ("Mega canon") a trigram index
+    narrows the names down to a few candidates that are then ranked by edit distance.
+    """
+
+    def __init__(self, items: Iterable[TradeItem]):
+        names = {item.name.lower(): item.name for item in items}
+        self.keys: List[str] = sorted(names)
+        self.choices: List[app_commands.Choice[str]] = [
+            app_commands.Choice(name=names[key], value=names[key]) for key in self.keys
+        ]
+
+        self.normalized: List[str] = [normalize(key) for key in self.keys]
+        self.trigram_index: Dict[str, List[int]] = collections.defaultdict(list)
+        self.trigram_counts: List[int] = []
+        for position, normalized in enumerate(self.normalized):
+            grams = trigrams(normalized)
+            self.trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_index[gram].append(position)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prefix_search(self, prefix: str, limit: int = 25) -> List[app_commands.Choice[str]]:
+        lower = prefix.lower()
+        start = bisect.bisect_left(self.keys, lower)
+        end = bisect.bisect_left(self.keys, lower + _PREFIX_END, start, min(start + limit, len(self.keys)))
+        return self.choices[start:end]
+
+    def fuzzy_search(self, query: str, limit: int = 25) -> List[app_commands.Choice[str]]:
+        query = normalize(query)
+        if not query:
+            return []
+
+        query_grams = trigrams(query)
+        shared: Dict[int, int] = collections.Counter()
+        for gram in query_grams:
+            for position in self.trigram_index.get(gram, ()):
+                shared[position] += 1
+        if not shared:
+            return []
+
+        def dice(position: int) -> float:
+            return 2 * shared[position] / (len(query_grams) + self.trigram_counts[position])
+
+        candidates = sorted(shared, key=dice, reverse=True)[:_FUZZY_CANDIDATES]
+
+        max_distance = max(1, (len(query) + 1) // 3)
+        ranked = []
+        for position in candidates:
+            name = self.normalized[position]
+            # Also compare against the start of the name, since autocomplete queries are usually partial
+            distance = min(
+                bounded_edit_distance(query, name, max_distance),
+                bounded_edit_distance(query, name[: len(query)], max_distance) + 1,
+            )
+            similarity = dice(position)
+            if distance <= max_distance or similarity >= 0.5:
+                ranked.append((distance, -similarity, position))
+
+        ranked.sort()
+        return [self.choices[position] for _, _, position in ranked[:limit]]
+
+    def search(self, query: str, limit: int = 25) -> List[app_commands.Choice[str]]:
+        """Prefix matches first, topped up with fuzzy matches if there are fewer than ``limit``."""
+        results = self.prefix_search(query, limit)
+        if len(results) >= limit or not query:
+            return results
+
+        results = list(results)
+        seen = {choice.value for choice in results}
+        for choice in self.fuzzy_search(query, limit):
+            if choice.value not in seen:
+                results.append(choice)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def best_match(self, query: str) -> Optional[str]:
+        position = bisect.bisect_left(self.keys, query.lower())
+        if position < len(self.keys) and self.keys[position] == query.lower():
+            return self.choices[position].value
+
+        matches = self.fuzzy_search(query, limit=1)
+        return matches[0].value if matches else None
+
+
+@functools.lru_cache(maxsize=None)
+def chip_index(game: int, restricted: bool = False) -> ItemNameIndex:
+    chip_list = CHIP_LISTS[game]
+    return ItemNameIndex(chip_list.tradable_obtainable_chips if restricted else chip_list.all_chips)
+
+
+@functools.lru_cache(maxsize=None)
+def ncp_index(game: int, restricted: bool = False) -> ItemNameIndex:
+    ncp_list = NCP_LISTS[game]
+    return ItemNameIndex(ncp_list.tradable_obtainable_parts if restricted else ncp_list.all_parts)
+
+
+class GameDataIndex:
+    """Inverted indexes over one game's chips and NaviCust parts, for lookups the info commands make repeatedly."""
+
+    def __init__(self, game: int):
+        self.chips_by_code: Dict[Code, List[Chip]] = collections.defaultdict(list)
+        self.chips_by_name: Dict[str, List[Chip]] = collections.defaultdict(list)
+        for chip in CHIP_LISTS[game].all_chips:
+            self.chips_by_code[chip.code].append(chip)
+            self.chips_by_name[chip.name.lower()].append(chip)
+
+        # Keyed by color name since each game has its own color enum
+        self.parts_by_color: Dict[str, List[NaviCustPart]] = collections.defaultdict(list)
+        self.parts_by_name: Dict[str, List[NaviCustPart]] = collections.defaultdict(list)
+        for part in NCP_LISTS[game].all_parts:
+            self.parts_by_color[part.color.name].append(part)
+            self.parts_by_name[part.name.lower()].append(part)
+
+    def get_chips_by_name(self, name: str) -> List[Chip]:
+        return self.chips_by_name.get(name.lower(), [])
+
+    def get_parts_by_name(self, name: str) -> List[NaviCustPart]:
+        return self.parts_by_name.get(name.lower(), [])
+
+    def get_parts_by_color(self, color_name: str) -> List[NaviCustPart]:
+        return self.parts_by_color.get(color_name, [])
+
+
+@functools.lru_cache(maxsize=None)
+def game_data_index(game: int) -> GameDataIndex:
+    return GameDataIndex(game)
@@ -0,0 +1,104 @@
+import collections
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator
+
+from mrprog.bot.metrics import REGISTRY, MetricsRegistry
+
+
+def topic_matches(topic: str, topic_filter: str) -> bool:
+    """MQTT topic filter matching, with ``+`` for one level and a trailing ``#`` for any number of levels."""
+    levels = topic.split("/")
+    filter_levels = topic_filter.split("/")
+    for idx, filter_level in enumerate(filter_levels):
+        if filter_level == "#":
+            return True
+        if idx >= len(levels) or (filter_level != "+" and filter_level != levels[idx]):
+            return False
+    return len(levels) == len(filter_levels)
+
+
+class RetainedMessageCache(MutableMapping):
+    """Latest payload per MQTT topic, bounded in entries and bytes by evicting the least recently updated topic.
+
+    Only topics matching ``evictable_filters`` are ever evicted. Control topics like bot/enabled are few and small,
+    but reading a missing one as "off" would make the bot look disabled, so they are kept even over the bounds.
+
+    Reads don't count as a use. The status embeds read the cache while iterating over it, and retained topics
+    that matter get republished whenever they change anyway.
+
+    Topics matching ``skip_filters`` are never stored. Those are the payloads that are already parsed into richer
+    state elsewhere (like worker current_trade blobs), so keeping the raw bytes around as well would only cost
+    memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        max_bytes: int = 4 * 2**20,
+        skip_filters: Iterable[str] = (),
+        evictable_filters: Iterable[str] = ("#",),
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.skip_filters = tuple(skip_filters)
+        self.evictable_filters = tuple(evictable_filters)
+        self.size_bytes = 0
+        self.evictions = 0
+        self._messages: Dict[str, bytes] = collections.OrderedDict()
+
+        self.entries_gauge = registry.gauge("mrprog_mqtt_cache_entries", "Number of cached MQTT topics")
+        self.bytes_gauge = registry.gauge("mrprog_mqtt_cache_bytes", "Payload bytes held by the MQTT topic cache")
+        self.evictions_counter = registry.counter(
+            "mrprog_mqtt_cache_evictions_total", "MQTT topics evicted from the cache to stay within its bounds"
+        )
+
+    def should_cache(self, topic: str) -> bool:
+        return not any(topic_matches(topic, topic_filter) for topic_filter in self.skip_filters)
+
+    def is_evictable(self, topic: str) -> bool:
+        return any(topic_matches(topic, topic_filter) for topic_filter in self.evictable_filters)
+
+    def __getitem__(self, topic: str) -> bytes:
+        return self._messages[topic]
+
+    def __setitem__(self, topic: str, payload: bytes) -> None:
+        if not self.should_cache(topic):
+            return
+        self._discard(topic)
+        self._messages[topic] = payload
+        self.size_bytes += len(payload)
+
+        while len(self._messages) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next((cached for cached in self._messages if self.is_evictable(cached)), None)
+            if oldest is None:
+                break
+            self._discard(oldest)
+            self.evictions += 1
+            self.evictions_counter.inc()
+        self._report()
+
+    def __delitem__(self, topic: str) -> None:
+        if not self._discard(topic):
+            raise KeyError(topic)
+        self._report()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, topic: object) -> bool:
+        return topic in self._messages
+
+    def _discard(self, topic: str) -> bool:
+        payload = self._messages.pop(topic, None)
+        if payload is None:
+            return False
+        self.size_bytes -= len(payload)
+        return True
+
+    def _report(self) -> None:
+        self.entries_gauge.set(len(self._messages))
+        self.bytes_gauge.set(self.size_bytes)
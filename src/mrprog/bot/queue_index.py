@@ -0,0 +1,107 @@
+import bisect
+import collections
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mrprog.utils.trade import TradeRequest
+
+GameKey = Tuple[str, int]
+# (-priority, submission sequence, correlation id): the order the broker's priority queue hands messages out in
+OrderKey = Tuple[int, int, str]
+
+
+class QueueIndex(Mapping):
+    """The pending trade queue, keyed by correlation id, kept in delivery order for each (system, game).
+
+    Each bucket is a sorted list of order keys, so a position is a bisect away rather than a sort. Requests are
+    also indexed by user so "is this user queued" and "where is this user" don't scan the queue. Iterating the
+    index itself yields correlation ids in submission order, which is what the queue journal stores.
+    """
+
+    def __init__(self, requests: Optional[Iterable[Tuple[str, TradeRequest]]] = None):
+        self._sequence = 0
+        self._entries: Dict[str, Tuple[GameKey, OrderKey, TradeRequest]] = {}
+        self._buckets: Dict[GameKey, List[OrderKey]] = collections.defaultdict(list)
+        self._by_user: Dict[int, Dict[str, None]] = {}
+        for correlation_id, request in requests or ():
+            self.add(correlation_id, request)
+
+    def __getitem__(self, correlation_id: str) -> TradeRequest:
+        return self._entries[correlation_id][2]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, correlation_id: object) -> bool:
+        return correlation_id in self._entries
+
+    def add(self, correlation_id: str, request: TradeRequest) -> None:
+        self.pop(correlation_id)
+        game_key = (request.system, request.game)
+        order_key = (-(request.priority or 0), self._sequence, correlation_id)
+        self._sequence += 1
+
+        self._entries[correlation_id] = (game_key, order_key, request)
+        bisect.insort(self._buckets[game_key], order_key)
+        self._by_user.setdefault(request.user_id, {})[correlation_id] = None
+
+    def pop(self, correlation_id: str) -> Optional[TradeRequest]:
+        entry = self._entries.pop(correlation_id, None)
+        if entry is None:
+            return None
+        game_key, order_key, request = entry
+
+        bucket = self._buckets[game_key]
+        del bucket[bisect.bisect_left(bucket, order_key)]
+        if not bucket:
+            del self._buckets[game_key]
+
+        user_requests = self._by_user[request.user_id]
+        del user_requests[correlation_id]
+        if not user_requests:
+            del self._by_user[request.user_id]
+        return request
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self._by_user.clear()
+
+    def game_keys(self) -> List[GameKey]:
+        return sorted(self._buckets)
+
+    def bucket_size(self, system: str, game: int) -> int:
+        return len(self._buckets.get((system, game), ()))
+
+    def bucket(self, system: str, game: int, limit: Optional[int] = None) -> List[Tuple[str, TradeRequest]]:
+        """The queued requests for a game in the order workers will receive them."""
+        order_keys = self._buckets.get((system, game), [])
+        if limit is not None:
+            order_keys = order_keys[:limit]
+        return [(correlation_id, self._entries[correlation_id][2]) for _, _, correlation_id in order_keys]
+
+    def at(self, system: str, game: int, index: int) -> Tuple[str, TradeRequest]:
+        correlation_id = self._buckets[(system, game)][index][2]
+        return correlation_id, self._entries[correlation_id][2]
+
+    def position(self, correlation_id: str) -> Optional[Tuple[GameKey, int]]:
+        """The (system, game) a request is queued for and its 0-based position there."""
+        entry = self._entries.get(correlation_id)
+        if entry is None:
+            return None
+        game_key, order_key, _ = entry
+        return game_key, bisect.bisect_left(self._buckets[game_key], order_key)
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self._by_user
+
+    def user_requests(self, user_id: int) -> List[Tuple[str, TradeRequest]]:
+        return [(correlation_id, self._entries[correlation_id][2]) for correlation_id in self._by_user.get(user_id, ())]
+
+    def user_position(self, user_id: int) -> Optional[Tuple[GameKey, int]]:
+        """Position of a user's earliest-served request, if they have any queued."""
+        positions = [self.position(correlation_id) for correlation_id in self._by_user.get(user_id, ())]
+        return min(positions, key=lambda position: position[1]) if positions else None
@@ -0,0 +1,123 @@
+import base64
+import collections
+import json
+import logging
+import os
+from typing import Dict, Mapping
+
+from mrprog.utils.trade import TradeRequest
+
+logger = logging.getLogger(__name__)
+
+
+class QueueJournal:
+    """Append-only on-disk mirror of the trade queue.
+
+    Every submit, start, completion, cancellation and purge is appended as one JSON line, so replaying the file
+    rebuilds the queue without touching the broker. Once enough dead records pile up the file is compacted into
+    one submit record per live entry.
+    """
+
+    SUBMIT = "submit"
+    START = "start"
+    COMPLETE = "complete"
+    CANCEL = "cancel"
+    CLEAR = "clear"
+
+    def __init__(self, path: str, compact_threshold: int = 1000):
+        self.path = path
+        self.compact_threshold = compact_threshold
+        self._file = None
+        self._live_records = 0
+        self._dead_records = 0
+
+    def load(self) -> Dict[str, TradeRequest]:
+        queue: Dict[str, TradeRequest] = collections.OrderedDict()
+        self._live_records = 0
+        self._dead_records = 0
+        bad_records = 0
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                        self._replay(queue, record)
+                    except (ValueError, KeyError):
+                        # A crash mid-write can leave a torn final line behind
+                        logger.warning(f"Skipping bad queue journal record on line {line_number}")
+                        bad_records += 1
+        except FileNotFoundError:
+            logger.debug("Queue journal doesn't exist, starting with an empty queue")
+
+        self._live_records = len(queue)
+        if bad_records:
+            # Rewrite so that new records aren't appended onto the end of a torn line
+            self.rewrite(queue)
+        logger.info(f"Loaded {len(queue)} queued requests from {self.path}")
+        return queue
+
+    def _replay(self, queue: Dict[str, TradeRequest], record: dict) -> None:
+        op = record["op"]
+        if op == self.SUBMIT:
+            queue[record["id"]] = TradeRequest.from_bytes(base64.b64decode(record["request"]))
+        elif op == self.CLEAR:
+            self._dead_records += len(queue) + 1
+            queue.clear()
+        else:
+            if queue.pop(record["id"], None) is not None:
+                self._dead_records += 1
+            self._dead_records += 1
+
+    def _append(self, record: dict) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def submit(self, correlation_id: str, request: TradeRequest) -> None:
+        self._append(
+            {
+                "op": self.SUBMIT,
+                "id": correlation_id,
+                "request": base64.b64encode(request.to_bytes()).decode("ascii"),
+            }
+        )
+        self._live_records += 1
+
+    def remove(self, correlation_id: str, op: str) -> None:
+        self._append({"op": op, "id": correlation_id})
+        self._live_records = max(self._live_records - 1, 0)
+        self._dead_records += 2
+
+    def clear(self) -> None:
+        self._append({"op": self.CLEAR})
+        self._dead_records += self._live_records + 1
+        self._live_records = 0
+
+    def needs_compaction(self) -> bool:
+        return self._dead_records >= max(self.compact_threshold, self._live_records)
+
+    def rewrite(self, queue: Mapping[str, TradeRequest]) -> None:
+        """Replace the journal with one submit record per entry in ``queue``."""
+        self.close()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for correlation_id, request in queue.items():
+                record = {
+                    "op": self.SUBMIT,
+                    "id": correlation_id,
+                    "request": base64.b64encode(request.to_bytes()).decode("ascii"),
+                }
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        self._live_records = len(queue)
+        self._dead_records = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,12 +1,13 @@
 import asyncio
 import collections
+import contextlib
 import hashlib
 import json
 import logging
 import platform
-import re
+import time
 import uuid
-from typing import Callable, Dict, List, Optional, Tuple, Union
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 import aio_pika
 import asyncio_mqtt
@@ -19,136 +20,86 @@ from aio_pika.abc import (
     AbstractQueue,
     AbstractRobustConnection,
 )
-from mrprog.bot.supported_games import SUPPORTED_GAMES
+from aio_pika.pool import Pool
 from mrprog.utils.trade import TradeRequest, TradeResponse
 from mrprog.utils.types import TradeItem
 
-logger = logging.getLogger(__name__)
-
+from mrprog.bot.batch_publisher import BatchPublisher
+from mrprog.bot.cancelled_requests import CancelledRequests
+from mrprog.bot.message_cache import RetainedMessageCache
+from mrprog.bot.metrics import REGISTRY
+from mrprog.bot.queue_index import QueueIndex
+from mrprog.bot.queue_journal import QueueJournal
+from mrprog.bot.supported_games import SUPPORTED_GAMES
+from mrprog.bot.topic_dispatcher import TopicDispatcher, TopicMessage
+from mrprog.bot.trade_eta import TradeDurationEstimator
+from mrprog.bot.trade_ids import TradeIdAllocator
+from mrprog.bot.trade_lifecycle import TradeLifecycleTracker, request_key
+from mrprog.bot.worker_history import WorkerHistory
+from mrprog.bot.worker_registry import WorkerRecord, WorkerRegistry
 
-class WorkerStatus:
-    def __init__(self):
-        self._hostname = ""
-        self._address = ""
-        self._system = ""
-        self._game = 0
-        self._available = False
-        self._enabled = False
-        self._version = {}
-        self._current_trade = None
-
-    def update(self, topic: str, message: bytes):
-        self.__setattr__(topic, message)
-    
-    @property
-    def hostname(self) -> str:
-        return self._hostname
-    
-    @hostname.setter
-    def hostname(self, new_hostname: Union[bytes, str]) -> None:
-        if isinstance(new_hostname, bytes):
-            self._hostname = new_hostname.decode("utf-8")
-        else:
-            self._hostname = new_hostname
-    
-    @property
-    def address(self) -> str:
-        return self._address
-    
-    @address.setter
-    def address(self, new_address: Union[bytes, str]) -> None:
-        if isinstance(new_address, bytes):
-            self._address = new_address.decode("utf-8")
-        else:
-            self._address = new_address
-    
-    @property
-    def system(self) -> str:
-        return self._system
-    
-    @system.setter
-    def system(self, new_system: Union[bytes, str]) -> None:
-        if isinstance(new_system, bytes):
-            self._system = new_system.decode("utf-8")
-        else:
-            self._system = new_system
-    
-    @property
-    def game(self) -> int:
-        return self._game
-    
-    @game.setter
-    def game(self, new_game: Union[bytes, int]) -> None:
-        if isinstance(new_game, bytes):
-            self._game = int(new_game.decode("utf-8"))
-        else:
-            self._game = new_game
-    
-    @property
-    def available(self) -> bool:
-        return self._available
-    
-    @available.setter
-    def available(self, new_available: Union[bytes, bool]) -> None:
-        if isinstance(new_available, bytes):
-            self._available = new_available.decode("utf-8")
-        else:
-            self._available = new_available
-    
-    @property
-    def enabled(self) -> bool:
-        return self._enabled
-    
-    @enabled.setter
-    def enabled(self, new_enabled: Union[bytes, bool]) -> None:
-        if isinstance(new_enabled, bytes):
-            self._enabled = new_enabled.decode("utf-8")
-        else:
-            self._enabled = new_enabled
-    
-    @property
-    def version(self) -> Dict[str, str]:
-        return self._version
-    
-    @version.setter
-    def version(self, new_version: Union[bytes, Dict[str, str]]) -> None:
-        if isinstance(new_version, bytes):
-            self._version = json.loads(new_version.decode("utf-8"))
-        else:
-            self._version = new_version
-    
-    @property
-    def current_trade(self) -> TradeRequest:
-        return self._current_trade
-    
-    @current_trade.setter
-    def current_trade(self, new_current_trade: Union[bytes, Optional[TradeRequest]]) -> None:
-        if isinstance(new_current_trade, bytes):
-            if new_current_trade == b"":
-                self._current_trade = None
-            else:
-                self._current_trade = TradeRequest.from_bytes(new_current_trade)
-        else:
-            self._current_trade = new_current_trade
+logger = logging.getLogger(__name__)
 
 
 # noinspection PyTypeChecker
 class TradeRequestRpcClient:
+    QUEUE_CHANGED = "queue"
+    WORKERS_CHANGED = "workers"
+
+    # Only the topic families the bot reads, rather than everything else on the shared broker
+    SUBSCRIPTIONS = ("worker/+/+", "game/+/+/enabled", "bot/#")
+    # Parsed into the worker registry as they arrive, so there's no need to keep the raw blobs too
+    UNCACHED_TOPICS = ("worker/+/current_trade", "worker/+/heartbeat")
+    # Only worker topics may be evicted to bound the cache. A missing bot/ or game/ topic would read as disabled.
+    EVICTABLE_TOPICS = ("worker/#",)
+
     mqtt_client: asyncio_mqtt.Client
 
     amqp_connection: AbstractRobustConnection
     channel: AbstractChannel
+    channel_pool: Pool
     task_queues: Dict[Tuple[str, int], AbstractQueue]
     notification_queue: AbstractQueue
     loop: asyncio.AbstractEventLoop
     exchange: AbstractExchange
 
-    def __init__(self, host: str, username: str, password: str, message_room_code_cb, handle_trade_complete_cb):
+    def __init__(
+        self,
+        host: str,
+        username: str,
+        password: str,
+        message_room_code_cb,
+        handle_trade_complete_cb,
+        journal_path: str = "trade_queue.journal",
+        channel_pool_size: int = 4,
+        heartbeat_timeout: float = 90,
+        heartbeat_check_interval: float = 15,
+        cancelled_wait_timeout: float = 5,
+        cancelled_prune_interval: float = 60,
+    ):
         self.loop = asyncio.get_running_loop()
 
-        self.request_counter = 0
-        self.cached_queue: Dict[str, TradeRequest] = {}
-        self.queue_modified = False
+        self.trade_ids = TradeIdAllocator(self._reserve_trade_ids)
+        self.queue_journal = QueueJournal(journal_path)
+        self.cached_queue = QueueIndex(self.queue_journal.load().items())
+        # User id -> number of workers currently trading with them
+        self.in_progress_users: Dict[int, int] = collections.Counter()
+
+        self.trade_lifecycle = TradeLifecycleTracker()
+        for correlation_id, request in self.cached_queue.items():
+            self.trade_lifecycle.submitted(correlation_id, request, None, None)
+        self.trade_eta = TradeDurationEstimator()
+        self.worker_history = WorkerHistory()
+
+        # Changes made to the queue while refresh_queue drains the broker, as (op, correlation id, request). They're
+        # replayed onto the drained copy so swapping it in doesn't lose them.
+        self._queue_changes: Optional[List[Tuple[str, str, Optional[TradeRequest]]]] = None
+        self._refresh_lock = asyncio.Lock()
+
+        # Published to bot/cancelled so workers can skip (ack and drop) these messages when they pick them up
+        self.cancelled_requests = CancelledRequests()
+        self.cancelled_wait_timeout = cancelled_wait_timeout
+        self.cancelled_prune_interval = cancelled_prune_interval
 
         self.message_room_code_cb = message_room_code_cb
         self.handle_trade_update_cb = handle_trade_complete_cb
@@ -157,49 +108,124 @@ class TradeRequestRpcClient:
         self._mqtt_connection_info = (host, username, password)
 
         self._mqtt_update_task = None
+        self._reconcile_task = None
+        self._heartbeat_task = None
+        self._cancelled_task = None
         self.task_queues = {}
+        self.channel_pool_size = channel_pool_size
+        self.publisher = BatchPublisher(self._publish_request)
+        self.channel_acquire_time = REGISTRY.histogram(
+            "mrprog_amqp_channel_acquire_seconds",
+            "Time spent waiting for a pooled AMQP channel",
+            buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+        )
 
-        self.topic_callbacks: Dict[str, Callable[[AbstractIncomingMessage], None]] = {}
-        self.cached_messages = {}
-        self.worker_statuses: Dict[str, WorkerStatus] = collections.defaultdict(WorkerStatus)
-        self.worker_status_modified = False
+        self.topic_dispatcher = TopicDispatcher()
+        self.cached_messages = RetainedMessageCache(
+            skip_filters=self.UNCACHED_TOPICS, evictable_filters=self.EVICTABLE_TOPICS
+        )
+        self.workers = WorkerRegistry()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.heartbeat_check_interval = heartbeat_check_interval
+        self.heartbeat_lag = REGISTRY.gauge(
+            "mrprog_worker_heartbeat_lag_seconds", "Seconds since a worker last published anything", ("worker",)
+        )
+
+        self.change_listeners: Dict[str, List[Callable[[], None]]] = collections.defaultdict(list)
 
     async def handle_mqtt_updates(self) -> None:
         async with self.mqtt_client.messages() as messages:
-            await self.mqtt_client.subscribe("#", qos=1)
+            await self.mqtt_client.subscribe([(topic_filter, 1) for topic_filter in self.SUBSCRIPTIONS])
             async for message in messages:
-                if message.payload is None or message.payload == "":
-                    del self.cached_messages[str(message.topic)]
+                if not message.payload:
+                    # An empty retained message clears the topic, which may never have been cached
+                    self.cached_messages.pop(str(message.topic), None)
                 else:
                     self.cached_messages[str(message.topic)] = message.payload
-                for watched_topic in self.topic_callbacks.keys():
-                    if message.topic.matches(watched_topic):
-                        self.topic_callbacks[watched_topic](message)
-
-    def handle_worker_updates(self, message: asyncio_mqtt.Message) -> None:
-        match = re.match(r"worker/([A-Za-z0-9_-]+)/(.*)", str(message.topic))
-        if not match:
-            logger.warning(f"Unable to match topic: {message.topic}")
+                self.topic_dispatcher.dispatch(str(message.topic), message.payload, bool(message.retain))
+
+    def handle_worker_updates(self, message: TopicMessage) -> None:
+        # Subscribed as worker/+/+, so the levels are always worker, id and field
+        _, worker_id, topic = message.levels
+
+        now = time.time()
+        if topic == "heartbeat":
+            self.workers.mark_seen(worker_id, self._parse_heartbeat(message.payload, now), heartbeat=True)
+            # Heartbeats don't change anything shown unless they revive a stale worker
+            if self.workers.refresh_stale(now, self.heartbeat_timeout, self.trade_eta.max_duration):
+                self.notify_changed(self.WORKERS_CHANGED)
+            return
+        if not message.retained:
+            # Any live message shows the worker is alive, so workers without heartbeats still get a last seen time
+            self.workers.mark_seen(worker_id, now)
+
+        record, previous = self.workers.update(worker_id, topic, message.payload)
+        if topic == "current_trade":
+            self._handle_current_trade_change(worker_id, previous, record.current_trade)
+        self.notify_changed(self.WORKERS_CHANGED)
+
+    @staticmethod
+    def _parse_heartbeat(payload: bytes, now: float) -> float:
+        # Heartbeats may carry the worker's own timestamp, which also dates a retained one replayed on subscribe
+        try:
+            return min(float(payload.decode("utf-8")), now)
+        except (UnicodeDecodeError, ValueError):
+            return now
+
+    async def watch_heartbeats(self) -> None:
+        """Periodically flag online workers that have gone quiet for too long and export each worker's lag."""
+        while True:
+            await asyncio.sleep(self.heartbeat_check_interval)
+            now = time.time()
+            if self.workers.refresh_stale(now, self.heartbeat_timeout, self.trade_eta.max_duration):
+                self.notify_changed(self.WORKERS_CHANGED)
+            for record in self.workers.listed():
+                lag = record.lag(now)
+                if lag is not None:
+                    self.heartbeat_lag.set(lag, worker=record.worker_id)
+
+    def _handle_current_trade_change(
+        self, worker_id: str, previous: Optional[TradeRequest], current: Optional[TradeRequest]
+    ) -> None:
+        # Retained messages are redelivered on reconnect, so only act on an actual change of trade
+        if previous is not None and current is not None and request_key(previous) == request_key(current):
             return
-        worker_id = match.group(1)
-        topic = match.group(2)
+        if previous is not None:
+            self.in_progress_users[previous.user_id] -= 1
+            if self.in_progress_users[previous.user_id] <= 0:
+                del self.in_progress_users[previous.user_id]
+        if current is None:
+            self.trade_eta.trade_finished(worker_id)
+        else:
+            self.in_progress_users[current.user_id] += 1
+            self.trade_lifecycle.picked_up(current, worker_id)
+            self.trade_eta.trade_started(worker_id, current.system, current.game)
+
+    def get_live_workers(self, system: str, game: int) -> List[str]:
+        return [
+            record.worker_id
+            for record in self.workers.for_platform(system, game, WorkerRecord.ONLINE)
+            if not record.stale
+        ]
+
+    def add_change_listener(self, kind: str, listener: Callable[[], None]) -> None:
+        self.change_listeners[kind].append(listener)
 
+    def remove_change_listener(self, kind: str, listener: Callable[[], None]) -> None:
         try:
-            self.worker_statuses[worker_id].update(topic, message.payload)
-            self.worker_status_modified = True
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
+            self.change_listeners[kind].remove(listener)
+        except ValueError:
+            pass
+
+    def notify_changed(self, kind: str) -> None:
+        for listener in self.change_listeners[kind]:
+            listener()
 
-    async def wait_for_message(self, topic: str) -> bytes:
+    async def wait_for_message(self, topic: str, timeout: Optional[float] = None) -> bytes:
         if topic in self.cached_messages:
             return self.cached_messages[topic]
-        else:
-            future = asyncio.Future()
-            self.topic_callbacks[topic] = lambda message: future.set_result(message.payload)
-            result = await future
-            self.topic_callbacks.pop(topic)
-            return result
+        message = await self.topic_dispatcher.wait_for(topic, timeout)
+        return message.payload
 
     async def publish_retained_message(self, topic: str, message: str) -> None:
         await self.mqtt_client.publish(topic=topic, payload=message, qos=1, retain=True)
@@ -213,11 +239,22 @@ class TradeRequestRpcClient:
                     ip_address = address.address
                     break
 
-        self.topic_callbacks["worker/#"] = self.handle_worker_updates
+        self.topic_dispatcher.subscribe("worker/+/+", self.handle_worker_updates)
+        self.topic_dispatcher.subscribe("bot/enabled", lambda _: self.notify_changed(self.WORKERS_CHANGED))
         self._mqtt_update_task = self.loop.create_task(self.handle_mqtt_updates())
 
         message = await self.wait_for_message("bot/trade_id")
-        self.request_counter = int(message.decode("utf-8"))
+        await self.trade_ids.start(int(message.decode("utf-8")))
+
+        # Retained messages arrive in no particular order, so bot/cancelled may still be on its way. Starting from an
+        # empty set before it arrives would overwrite the list on the next cancel.
+        try:
+            cancelled = await self.wait_for_message("bot/cancelled", timeout=self.cancelled_wait_timeout)
+        except asyncio.TimeoutError:
+            logger.info("No cancelled requests published yet")
+            cancelled = None
+        if cancelled:
+            self.cancelled_requests.load(json.loads(cancelled.decode("utf-8")))
 
         await self.mqtt_client.publish(topic="bot/hostname", payload=platform.node(), qos=1, retain=True)
         await self.mqtt_client.publish(topic="bot/address", payload=ip_address, qos=1, retain=True)
@@ -239,7 +276,10 @@ class TradeRequestRpcClient:
             self._amqp_connection_str,
             loop=self.loop,
         )
-        self.channel = await self.amqp_connection.channel()
+        self.channel = await self.amqp_connection.channel(publisher_confirms=True)
+        # Short-lived work (queue refreshes, passive declares) borrows one of these rather than opening its own
+        # connection or channel each time
+        self.channel_pool = Pool(self.amqp_connection.channel, max_size=self.channel_pool_size, loop=self.loop)
 
         # Declare an exchange
         self.exchange = await self.channel.declare_exchange(
@@ -258,43 +298,156 @@ class TradeRequestRpcClient:
         self.notification_queue = await self.channel.declare_queue(name="trade_status_update", durable=True)
         await self.notification_queue.bind(self.exchange, routing_key=self.notification_queue.name)
         await self.notification_queue.consume(self.on_trade_update)
+        self.publisher.start()
 
-        # Fetch saved messages from all task queues before starting
-        await self.refresh_queue()
+        # The journal already gave us the queue, so only check it against the broker in the background
+        self._reconcile_task = self.loop.create_task(self.reconcile_queue())
+        self._heartbeat_task = self.loop.create_task(self.watch_heartbeats())
+        self._cancelled_task = self.loop.create_task(self.watch_cancelled_requests())
 
         await self.mqtt_client.publish(topic="bot/available", payload="1", qos=1, retain=True)
 
-    async def refresh_queue(self, user_id: Optional[int] = None) -> int:
-        self.cached_queue.clear()
-
-        removed_messages = 0
+    @contextlib.asynccontextmanager
+    async def acquire_channel(self) -> AsyncIterator[AbstractChannel]:
+        start = time.perf_counter()
+        async with self.channel_pool.acquire() as channel:
+            self.channel_acquire_time.observe(time.perf_counter() - start)
+            yield channel
 
-        connection = await aio_pika.connect_robust(self._amqp_connection_str, loop=self.loop)
-        channel = await connection.channel()
+    async def reconcile_queue(self, attempts: int = 2, retry_delay: float = 10) -> None:
+        """Compare the journal against the broker's message counts and fall back to a full refresh on mismatch.
 
-        for system in SUPPORTED_GAMES:
-            for game in SUPPORTED_GAMES[system]:
-                task_queue = await channel.get_queue(f"{system}_bn{game}_task_queue")
+        Messages a worker has taken but not yet acked don't show up in the broker's ready count, and cancelled
+        messages may still be waiting in a task queue, so a mismatch is only trusted if it persists.
+        """
+        try:
+            for attempt in range(attempts):
+                mismatched = await self._find_mismatched_queues()
+                if not mismatched:
+                    logger.info("Queue journal matches broker")
+                    return
+                logger.info(f"Queue journal mismatch for {mismatched} (attempt {attempt + 1})")
+                await asyncio.sleep(retry_delay)
+
+            logger.warning("Queue journal is out of sync with broker, refreshing queue")
+            await self.refresh_queue()
+        except Exception:
+            logger.exception("Failed to reconcile queue journal")
+
+    async def _find_mismatched_queues(self) -> List[Tuple[str, int]]:
+        in_progress = {
+            (current_trade.user_id, str(current_trade.trade_item)) for _, current_trade in self.workers.in_progress()
+        }
+        unacked: Dict[Tuple[str, int], int] = collections.defaultdict(int)
+        for request in self.cached_queue.values():
+            if (request.user_id, str(request.trade_item)) in in_progress:
+                unacked[(request.system, request.game)] += 1
+
+        mismatched = []
+        for key, ready in (await self._ready_counts()).items():
+            expected = self.cached_queue.bucket_size(*key)
+            low = expected - unacked[key]
+            high = expected + self.cancelled_requests.bucket_size(*key)
+            if not low <= ready <= high:
+                mismatched.append(key)
+        return mismatched
+
+    async def _ready_counts(self) -> Dict[Tuple[str, int], int]:
+        """Messages waiting in each task queue, not counting those delivered to a worker but not yet acked."""
+        ready_counts = {}
+        async with self.acquire_channel() as channel:
+            for key, task_queue in self.task_queues.items():
+                declared = await channel.declare_queue(task_queue.name, passive=True)
+                ready_counts[key] = declared.declaration_result.message_count
+        return ready_counts
+
+    async def watch_cancelled_requests(self) -> None:
+        """Periodically stop tracking cancelled requests that workers have already dropped."""
+        while True:
+            await asyncio.sleep(self.cancelled_prune_interval)
+            if not self.cancelled_requests:
+                continue
+            try:
+                await self.prune_cancelled_requests()
+            except Exception:
+                logger.exception("Failed to prune cancelled requests")
+
+    async def prune_cancelled_requests(self) -> None:
+        capacity = {}
+        for (system, game), ready in (await self._ready_counts()).items():
+            # At least this many of the ready messages are live requests. Each worker may be holding one message
+            # it hasn't acked yet, which the ready count leaves out, so assume they all are.
+            live = max(self.cached_queue.bucket_size(system, game) - len(self.workers.for_platform(system, game)), 0)
+            capacity[(system, game)] = ready - live
+
+        dropped = self.cancelled_requests.prune(capacity)
+        if dropped:
+            logger.info(f"No longer tracking {dropped} cancelled requests, {len(self.cancelled_requests)} remain")
+            await self.publish_cancelled_requests()
+
+    async def refresh_queue(self) -> int:
+        async with self._refresh_lock:
+            queue = QueueIndex()
+            cancelled_before = list(self.cancelled_requests)
+            self._queue_changes = []
+            try:
+                removed_messages = await self._drain_task_queues(queue)
+                for op, correlation_id, request in self._queue_changes:
+                    if op == QueueJournal.SUBMIT:
+                        queue.add(correlation_id, request)
+                    elif op == QueueJournal.CLEAR:
+                        queue.clear()
+                    else:
+                        queue.pop(correlation_id)
+            finally:
+                self._queue_changes = None
+
+            self.cached_queue = queue
+            self.queue_journal.rewrite(queue)
+
+            # Anything cancelled before the drain and still in the set was already consumed by a worker. Later
+            # cancels may be for messages in a queue that had already been drained, so those stay.
+            consumed = [
+                correlation_id for correlation_id in cancelled_before if self.cancelled_requests.discard(correlation_id)
+            ]
+            if consumed:
+                await self.publish_cancelled_requests()
 
-                while True:
-                    try:
-                        message = await task_queue.get(timeout=5)
+        logger.info(f"Retrieved {len(self.cached_queue)} messages")
+        self.notify_changed(self.QUEUE_CHANGED)
+        return removed_messages
 
-                        request = TradeRequest.from_bytes(message.body)
-                        if request.user_id == user_id:
-                            await message.ack()
-                            removed_messages += 1
-                        else:
-                            self.cached_queue[message.correlation_id] = request
+    async def _drain_task_queues(self, queue: QueueIndex) -> int:
+        removed_messages = 0
 
-                    except aio_pika.exceptions.QueueEmpty:
-                        break
+        async with self.acquire_channel() as channel:
+            for system in SUPPORTED_GAMES:
+                for game in SUPPORTED_GAMES[system]:
+                    task_queue = await channel.get_queue(f"{system}_bn{game}_task_queue")
+                    last_kept: Optional[AbstractIncomingMessage] = None
 
-        await channel.close()
-        await connection.close()
+                    # Closing the channel used to hand these back to the broker. The pooled channel stays open, so
+                    # requeue everything still held in one go before anything else borrows it, even if draining
+                    # failed partway.
+                    try:
+                        while True:
+                            try:
+                                message = await task_queue.get(timeout=5)
+                            except aio_pika.exceptions.QueueEmpty:
+                                break
+
+                            if message.correlation_id in self.cancelled_requests:
+                                await message.ack()
+                                self.cancelled_requests.discard(message.correlation_id)
+                                removed_messages += 1
+                            else:
+                                # Held until the requeue below, even if its body turns out to be bad
+                                last_kept = message
+                                queue.add(message.correlation_id, TradeRequest.from_bytes(message.body))
+                    finally:
+                        if last_kept is not None:
+                            await last_kept.nack(multiple=True, requeue=True)
 
-        logger.info(f"Retrieved {len(self.cached_queue)} messages")
-        self.queue_modified = True
         return removed_messages
 
     async def on_trade_update(self, message: AbstractIncomingMessage) -> None:
@@ -305,24 +458,38 @@ class TradeRequestRpcClient:
 
             logger.info(f"Received message {message.correlation_id}")
 
+            if message.correlation_id in self.cancelled_requests:
+                # The worker picked up a cancelled request before seeing bot/cancelled, so don't act on it
+                logger.info(f"Ignoring update for cancelled request {message.correlation_id}")
+                response = TradeResponse.from_bytes(message.body)
+                if response.status != TradeResponse.IN_PROGRESS:
+                    self.trade_lifecycle.discard(message.correlation_id)
+                    self.cancelled_requests.discard(message.correlation_id)
+                    await self.publish_cancelled_requests()
+                return
+
             response = TradeResponse.from_bytes(message.body)
             if response.status == TradeResponse.IN_PROGRESS:
                 if response.image is not None:
-                    try:
-                        self.cached_queue.pop(message.correlation_id)
-                    except KeyError:
+                    if not self._remove_from_queue(message.correlation_id, QueueJournal.START):
                         logger.warning(f"Unable to find {message.correlation_id} in cached queue")
                     await self.message_room_code_cb(response)
+                    self.trade_lifecycle.room_code_sent(message.correlation_id)
                 else:
                     await self.handle_trade_update_cb(response)
             else:
-                try:
-                    self.cached_queue.pop(message.correlation_id)
-                except KeyError:
-                    pass
+                self._remove_from_queue(message.correlation_id, QueueJournal.COMPLETE)
+                now = time.time()
+                timeline = self.trade_lifecycle.finished(
+                    message.correlation_id, response.worker_id, response.status, now
+                )
+                duration = self.trade_eta.trade_finished(response.worker_id, now)
+                if timeline is not None and timeline.picked_up is not None:
+                    duration = now - timeline.picked_up
+                self.worker_history.record(response.worker_id, response.status, duration, now)
                 await self.handle_trade_update_cb(response)
 
-            self.queue_modified = True
+            self.notify_changed(self.QUEUE_CHANGED)
 
     async def submit_trade_request(
         self,
@@ -333,47 +500,104 @@ class TradeRequestRpcClient:
         game: int,
         trade_item: TradeItem,
         priority: Optional[int] = 0,
+        received_at: Optional[float] = None,
     ) -> None:
+        """Queue a trade and wait for the broker to confirm it, raising if it didn't."""
         correlation_id = str(uuid.uuid4())
 
-        trade_request = TradeRequest(
-            user_name, user_id, channel_id, system, game, self.request_counter, trade_item, priority
-        )
-        self.cached_queue[correlation_id] = trade_request
-        self.queue_modified = True
-
-        await self.exchange.publish(
-            Message(
-                body=trade_request.to_bytes(),
-                content_type="application/json",
-                correlation_id=correlation_id,
-                reply_to=self.notification_queue.name,
-                priority=priority,
-            ),
-            routing_key=f"requests.{system}.bn{game}",
+        trade_id = await self.trade_ids.allocate()
+        trade_request = TradeRequest(user_name, user_id, channel_id, system, game, trade_id, trade_item, priority)
+        self.cached_queue.add(correlation_id, trade_request)
+        self._record_queue_change(QueueJournal.SUBMIT, correlation_id, trade_request)
+        self.queue_journal.submit(correlation_id, trade_request)
+        self.notify_changed(self.QUEUE_CHANGED)
+
+        # Recorded before the confirm arrives, since a worker may pick the request up before then. Queue wait is
+        # counted from here, publish latency from the confirm.
+        self.trade_lifecycle.submitted(correlation_id, trade_request, received_at, time.time())
+
+        message = Message(
+            body=trade_request.to_bytes(),
+            content_type="application/json",
+            correlation_id=correlation_id,
+            reply_to=self.notification_queue.name,
+            priority=priority,
         )
-        self.request_counter += 1
-        await self.mqtt_client.publish(topic="bot/trade_id", payload=self.request_counter, qos=1, retain=True)
+        try:
+            await self.publisher.publish(message, f"requests.{system}.bn{game}")
+        except Exception:
+            logger.exception(f"Failed to publish request {correlation_id}")
+            self._remove_from_queue(correlation_id, QueueJournal.CANCEL)
+            self.trade_lifecycle.discard(correlation_id)
+            self.notify_changed(self.QUEUE_CHANGED)
+            raise
+        self.trade_lifecycle.publish_confirmed(trade_request, received_at)
+
+    async def _publish_request(self, message: Message, routing_key: str) -> None:
+        await self.exchange.publish(message, routing_key=routing_key)
+
+    async def _reserve_trade_ids(self, high_water_mark: int) -> None:
+        # qos=1 waits for the broker's ack, so the reservation is stored before any of its ids are handed out
+        await self.mqtt_client.publish(topic="bot/trade_id", payload=high_water_mark, qos=1, retain=True)
 
     async def cancel_trade_request(self, user_id: int) -> bool:
-        removed = await self.refresh_queue(user_id)
-        return removed > 0
-
-    def get_current_queue(
-        self,
-    ) -> Tuple[List[Tuple[int, TradeRequest]], List[Tuple[str, TradeRequest]], Dict[int, TradeRequest]]:
-        in_progress = []
-        for worker_id, status in self.worker_statuses.items():
-            if status.current_trade:
-                in_progress.append((worker_id, status.current_trade))
-
-        return list(self.cached_queue.items()), in_progress, {request.user_id: request for request in self.cached_queue.values()}
+        cancelled = self.cached_queue.user_requests(user_id)
+        if not cancelled:
+            return False
+
+        for correlation_id, request in cancelled:
+            self._remove_from_queue(correlation_id, QueueJournal.CANCEL)
+            self.trade_lifecycle.discard(correlation_id)
+            self.cancelled_requests.add(correlation_id, request)
+        self.notify_changed(self.QUEUE_CHANGED)
+
+        await self.publish_cancelled_requests()
+        return True
+
+    def _record_queue_change(self, op: str, correlation_id: str = "", request: Optional[TradeRequest] = None) -> None:
+        if self._queue_changes is not None:
+            self._queue_changes.append((op, correlation_id, request))
+
+    def _remove_from_queue(self, correlation_id: str, op: str) -> bool:
+        # Recorded even if it isn't queued here, since a refresh may have drained it from the broker
+        self._record_queue_change(op, correlation_id)
+        if self.cached_queue.pop(correlation_id) is None:
+            return False
+
+        self.queue_journal.remove(correlation_id, op)
+        if self.queue_journal.needs_compaction():
+            self.queue_journal.rewrite(self.cached_queue)
+        return True
+
+    async def publish_cancelled_requests(self) -> None:
+        await self.publish_retained_message("bot/cancelled", self.cancelled_requests.to_json())
+
+    def get_queued_request(self, user_id: int) -> Optional[TradeRequest]:
+        """The user's request that will be served first, if they have any queued."""
+        position = self.cached_queue.user_position(user_id)
+        if position is None:
+            return None
+        (system, game), index = position
+        return self.cached_queue.at(system, game, index)[1]
+
+    def is_in_progress(self, user_id: int) -> bool:
+        return user_id in self.in_progress_users
+
+    def is_bot_enabled(self) -> bool:
+        return self.cached_messages.get("bot/enabled", b"0") == b"1"
 
     async def clear_queue(self) -> None:
         for key, task_queue in self.task_queues.items():
             await task_queue.purge()
         self.cached_queue.clear()
-        self.queue_modified = True
+        self._record_queue_change(QueueJournal.CLEAR)
+        self.queue_journal.clear()
+        self.trade_lifecycle.clear()
+        self.notify_changed(self.QUEUE_CHANGED)
+
+        if self.cancelled_requests:
+            self.cancelled_requests.clear()
+            await self.publish_cancelled_requests()
 
     async def set_game_enabled(self, system: str, game: int, enabled: bool) -> None:
         logger.info(f"Setting game {system} {game} to {enabled}")
@@ -392,10 +616,17 @@ class TradeRequestRpcClient:
         await self.mqtt_client.publish(topic=f"bot/enabled", payload="1" if enabled else "0", qos=1, retain=True)
 
     async def disconnect(self) -> None:
-        self._mqtt_update_task.cancel()
-        try:
-            await self._mqtt_update_task
-        except asyncio.CancelledError:
-            pass
+        await self.publisher.close()
+        await self.trade_ids.close()
+        for task in [self._reconcile_task, self._heartbeat_task, self._cancelled_task, self._mqtt_update_task]:
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.queue_journal.close()
+        await self.channel_pool.close()
         await self.amqp_connection.close()
         await self.mqtt_client.disconnect()
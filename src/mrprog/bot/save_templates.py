@@ -0,0 +1,148 @@
+import collections
+import functools
+import mmap
+import pkgutil
+from typing import Dict, Iterable, Mapping, Optional, Tuple, Union
+
+# Offset of the 32-bit Steam account ID in a decrypted BNLC save
+STEAM_ID_OFFSET = 6496
+
+
+@functools.lru_cache(maxsize=None)
+def _xor_table(key: int) -> bytes:
+    return bytes(i ^ key for i in range(256))
+
+
+def array_xor(data: Union[bytes, bytearray, memoryview], key: int) -> bytearray:
+    # bytes.translate does the per-byte lookup in C
+    return bytearray(bytes(data).translate(_xor_table(key)))
+
+
+class PatchField:
+    """A value written into a decrypted save at a fixed offset.
+
+    ``encoding`` is ``"le"``/``"be"`` for unsigned integers or ``"ascii"`` for NUL-padded strings.
+    """
+
+    ENCODINGS = ("le", "be", "ascii")
+
+    def __init__(self, offset: int, width: int, encoding: str = "le"):
+        if encoding not in self.ENCODINGS:
+            raise ValueError(f"Unknown encoding {encoding}")
+        self.offset = offset
+        self.width = width
+        self.encoding = encoding
+
+    def encode(self, value: Union[int, str]) -> bytes:
+        if self.encoding == "ascii":
+            encoded = value.encode("ascii")
+            if len(encoded) > self.width:
+                raise ValueError(f"{value!r} is longer than {self.width} bytes")
+            return encoded.ljust(self.width, b"\0")
+        return value.to_bytes(self.width, "little" if self.encoding == "le" else "big")
+
+
+class SaveTemplateSpec:
+    def __init__(self, name: str, title: str, fields: Mapping[str, PatchField]):
+        self.name = name
+        self.title = title
+        self.fields = dict(fields)
+
+    @property
+    def filename(self) -> str:
+        return f"{self.name}_save_0.bin"
+
+
+STEAM_ID_FIELD = PatchField(STEAM_ID_OFFSET, 4, "le")
+
+# Templates live in mrprog/bot/saves/<name>_save_0.bin. Adding another BNLC title only needs its template file and
+# an entry here describing where its patchable fields are.
+SAVE_TEMPLATES: Dict[str, SaveTemplateSpec] = {
+    spec.name: spec
+    for spec in [
+        SaveTemplateSpec("exe6f", "Battle Network 6 Falzar", {"steam_id": STEAM_ID_FIELD}),
+        SaveTemplateSpec("exe6g", "Battle Network 6 Gregar", {"steam_id": STEAM_ID_FIELD}),
+    ]
+}
+
+
+class SaveTemplate:
+    """A BNLC save file template held in memory in its encrypted form.
+
+    Saves are encrypted by XORing every byte with the key stored at offset 1. That is position independent, so
+    patching a field only needs the patched bytes re-encrypted rather than the whole file.
+    """
+
+    def __init__(self, spec: SaveTemplateSpec, encrypted: Union[bytes, memoryview]):
+        self.spec = spec
+        self.encrypted = encrypted
+        self.xor_key = self.encrypted[1]
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    @property
+    def filename(self) -> str:
+        return self.spec.filename
+
+    def render(self, values: Mapping[str, Union[int, str]]) -> bytearray:
+        """Return an encrypted copy of the template with each named field set to the given value."""
+        result = bytearray(self.encrypted)
+        for field_name, value in values.items():
+            field = self.spec.fields[field_name]
+            result[field.offset : field.offset + field.width] = array_xor(field.encode(value), self.xor_key)
+        return result
+
+    def with_steam_id(self, steamid_32: int) -> bytearray:
+        return self.render({"steam_id": steamid_32})
+
+
+class SaveTemplateStore:
+    """Every registered template loaded into one anonymous memory map, plus a small cache of generated saves."""
+
+    def __init__(self, specs: Iterable[SaveTemplateSpec], cache_size: int = 128):
+        specs = list(specs)
+        contents = [pkgutil.get_data("mrprog.bot", f"saves/{spec.filename}") for spec in specs]
+
+        self._blob = mmap.mmap(-1, max(sum(len(content) for content in contents), 1))
+        view = memoryview(self._blob)
+        self.templates: Dict[str, SaveTemplate] = {}
+        offset = 0
+        for spec, content in zip(specs, contents):
+            self._blob[offset : offset + len(content)] = content
+            self.templates[spec.name] = SaveTemplate(spec, view[offset : offset + len(content)])
+            offset += len(content)
+
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[str, int], bytes] = collections.OrderedDict()
+
+    def __getitem__(self, name: str) -> SaveTemplate:
+        return self.templates[name]
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def get_save(self, name: str, steamid_32: int) -> bytes:
+        key = (name, steamid_32)
+        save: Optional[bytes] = self._cache.get(key)
+        if save is not None:
+            self._cache.move_to_end(key)
+            return save
+
+        save = bytes(self.templates[name].with_steam_id(steamid_32))
+        self._cache[key] = save
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return save
+
+    def close(self) -> None:
+        self._cache.clear()
+        for template in self.templates.values():
+            template.encrypted.release()
+        self.templates.clear()
+        self._blob.close()
+
+
+def load_templates(names: Optional[Iterable[str]] = None) -> SaveTemplateStore:
+    return SaveTemplateStore(SAVE_TEMPLATES[name] for name in (names if names is not None else SAVE_TEMPLATES))
@@ -1,27 +1,73 @@
+import bisect
 import collections
+import itertools
 import logging
 import pickle
-from typing import Dict, List, Tuple
+from typing import Dict, Hashable, List, Optional, Tuple
 
-from mmbn.gamedata.chip_list import ChipList
 from mrprog.utils.types import TradeItem
 
+from mrprog.bot.supported_games import CHIP_LISTS
+
 logger = logging.getLogger(__name__)
 
 
+class Leaderboard:
+    """Counts per key, kept ordered by count so that the top k can be read without sorting.
+
+    Keys with equal counts are grouped into buckets, and the distinct counts are kept in a sorted list. Since counts
+    only ever grow by small steps, moving a key between buckets is O(1) apart from the rare insertion of a new
+    distinct count.
+    """
+
+    def __init__(self):
+        self.counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._sorted_counts: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def increment(self, key: Hashable, amount: int = 1) -> None:
+        old_count = self.counts.get(key, 0)
+        if old_count:
+            bucket = self._buckets[old_count]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[old_count]
+                del self._sorted_counts[bisect.bisect_left(self._sorted_counts, old_count)]
+
+        new_count = old_count + amount
+        self.counts[key] = new_count
+        if new_count not in self._buckets:
+            self._buckets[new_count] = {}
+            bisect.insort(self._sorted_counts, new_count)
+        self._buckets[new_count][key] = None
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        items = ((key, count) for count in reversed(self._sorted_counts) for key in self._buckets[count])
+        return list(itertools.islice(items, limit))
+
+
 class UserTradeStats:
     def __init__(self, user_id: int):
         self.user_id = user_id
         self.trades: Dict[TradeItem, int] = collections.defaultdict(int)
+        self.total_trades = 0
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "total_trades" not in state:
+            # Pickled before running totals were tracked
+            self.total_trades = sum(self.trades.values())
 
     def add_trade(self, trade: TradeItem):
-        self.trades[trade] += 1
+        # trades may be a plain dict after the pickle migration in BotTradeStats.load_or_default
+        self.trades[trade] = self.trades.get(trade, 0) + 1
+        self.total_trades += 1
 
     def get_total_trade_count(self) -> int:
-        total = 0
-        for qty in self.trades.values():
-            total += qty
-        return total
+        return self.total_trades
 
     def get_trades_by_trade_count(self) -> List[Tuple[TradeItem, int]]:
         return [(k, v) for k, v in sorted(self.trades.items(), key=lambda item: item[1], reverse=True)]
@@ -30,34 +76,59 @@ class UserTradeStats:
 class BotTradeStats:
     def __init__(self):
         self.users: Dict[int, UserTradeStats] = {}
+        self.total_trades = 0
+        self.user_leaderboard = Leaderboard()
+        self.item_leaderboard = Leaderboard()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "total_trades" not in state:
+            # Pickled before running totals were tracked
+            self.rebuild_aggregates()
+
+    def rebuild_aggregates(self) -> None:
+        self.total_trades = 0
+        self.user_leaderboard = Leaderboard()
+        self.item_leaderboard = Leaderboard()
+        for user in self.users.values():
+            user.total_trades = sum(user.trades.values())
+            self.total_trades += user.total_trades
+            self.user_leaderboard.increment(user.user_id, user.total_trades)
+            for trade_item, qty in user.trades.items():
+                self.item_leaderboard.increment(trade_item, qty)
+
+    def copy_totals(self) -> Dict[int, Dict[TradeItem, int]]:
+        """Per-user trade counts, copied so they can be snapshotted off the event loop while trades keep coming in."""
+        return {user_id: dict(user.trades) for user_id, user in self.users.items()}
+
+    @classmethod
+    def from_totals(cls, totals: Dict[int, Dict[TradeItem, int]]) -> "BotTradeStats":
+        stats = cls()
+        for user_id, trades in totals.items():
+            stats.users[user_id] = UserTradeStats(user_id)
+            stats.users[user_id].trades.update(trades)
+        stats.rebuild_aggregates()
+        return stats
 
     def add_trade(self, user_id: int, trade_item: TradeItem):
         if user_id not in self.users:
             self.users[user_id] = UserTradeStats(user_id)
         self.users[user_id].add_trade(trade_item)
+        self.total_trades += 1
+        self.user_leaderboard.increment(user_id)
+        self.item_leaderboard.increment(trade_item)
 
     def get_total_trade_count(self) -> int:
-        total = 0
-        for user in self.users.values():
-            total += user.get_total_trade_count()
-        return total
+        return self.total_trades
 
     def get_total_user_count(self) -> int:
         return len(self.users)
 
-    def get_users_by_trade_count(self) -> List[UserTradeStats]:
-        all_users = self.users.values()
-        sorted_users = sorted(all_users, key=lambda user: user.get_total_trade_count(), reverse=True)
-        return sorted_users
-
-    def get_trades_by_trade_count(self) -> List[Tuple[TradeItem, int]]:
-        all_items: Dict[TradeItem, int] = collections.defaultdict(int)
-        for user in self.users.values():
-            for trade_item in user.trades:
-                all_items[trade_item] += user.trades[trade_item]
+    def get_users_by_trade_count(self, limit: Optional[int] = None) -> List[UserTradeStats]:
+        return [self.users[user_id] for user_id, _ in self.user_leaderboard.top(limit)]
 
-        item_tuples = [(item, all_items[item]) for item in all_items]
-        return sorted(item_tuples, key=lambda chip_tuple: chip_tuple[1], reverse=True)
+    def get_trades_by_trade_count(self, limit: Optional[int] = None) -> List[Tuple[TradeItem, int]]:
+        return self.item_leaderboard.top(limit)
 
     def save(self, path: str) -> None:
         with open(path, "wb") as f:
@@ -69,9 +140,6 @@ class BotTradeStats:
         # TODO: Remove this later
         try:
             from mmbn.gamedata.chip import Chip
-            chip_lists = {
-                game: ChipList(game) for game in [1, 2, 3, 4, 5, 6]
-            }
             with open(path, "rb") as f:
                 stats: BotTradeStats = pickle.load(f)
             for _, uts in stats.users.items():
@@ -79,7 +147,7 @@ class BotTradeStats:
                 for item, count in uts.trades.items():
                     if isinstance(item, Chip):
                         game = int(item.__class__.__name__.replace("BN", "").replace("Chip", ""))
-                        chip = chip_lists[game].get_chip(item.name, item.code)
+                        chip = CHIP_LISTS.load(game).get_chip(item.name, item.code)
 
                         if chip is None:
                             continue
@@ -90,6 +158,7 @@ class BotTradeStats:
                             item.chip_type = Chip.GIGA
                     new_trades[item] = count
                 uts.trades = new_trades
+            stats.rebuild_aggregates()
             with open(path, "wb") as f:
                 pickle.dump(stats, f)
             return stats
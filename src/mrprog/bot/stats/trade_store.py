@@ -0,0 +1,155 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from mrprog.utils.types import TradeItem
+
+from mrprog.bot.stats.trade_stats import BotTradeStats
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    user_id INTEGER NOT NULL,
+    system TEXT,
+    game INTEGER,
+    item BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_timestamp ON trades (timestamp);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    last_trade_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    stats BLOB NOT NULL
+);
+"""
+
+
+class TradeStatsStore:
+    """Append-only SQLite store for trade stats.
+
+    Each completed trade is one row in ``trades``. Every ``snapshot_interval`` trades the in-memory
+    ``BotTradeStats`` is pickled into ``snapshots`` so that loading only has to replay the trades recorded since
+    then. All database access happens on a single background thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path: str, legacy_pickle_path: Optional[str] = None, snapshot_interval: int = 500):
+        self.path = path
+        self.legacy_pickle_path = legacy_pickle_path
+        self.snapshot_interval = snapshot_interval
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="trade-stats")
+        self._db: Optional[sqlite3.Connection] = None
+        self._trades_since_snapshot = 0
+
+    def _submit(self, func, *args) -> "asyncio.Future":
+        # Submits synchronously so that jobs reach the executor in the order they were requested
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    async def load(self) -> BotTradeStats:
+        stats, replayed = await self._submit(self._load)
+        self._trades_since_snapshot = replayed
+        return stats
+
+    def _load(self):
+        db = self._connect()
+
+        row = db.execute("SELECT last_trade_id, stats FROM snapshots ORDER BY id DESC LIMIT 1").fetchone()
+        trade_count = db.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+        if row is None and trade_count == 0 and self.legacy_pickle_path and os.path.exists(self.legacy_pickle_path):
+            stats = BotTradeStats.load_or_default(self.legacy_pickle_path)
+            self._write_snapshot(pickle.dumps(stats), 0)
+            os.replace(self.legacy_pickle_path, f"{self.legacy_pickle_path}.imported")
+            logger.info(f"Imported bot stats from {self.legacy_pickle_path}")
+            return stats, 0
+
+        if row is None:
+            stats, last_trade_id = BotTradeStats(), 0
+        else:
+            last_trade_id, blob = row
+            stats = pickle.loads(blob)
+
+        replayed = 0
+        for user_id, item in db.execute("SELECT user_id, item FROM trades WHERE id > ? ORDER BY id", (last_trade_id,)):
+            stats.add_trade(user_id, pickle.loads(item))
+            replayed += 1
+
+        logger.info(f"Loaded bot stats from {self.path} ({replayed} trades replayed since last snapshot)")
+        return stats, replayed
+
+    async def load_recent_trades(self, since: float) -> List[Tuple[float, str, int, TradeItem]]:
+        return await self._submit(self._load_recent_trades, since)
+
+    def _load_recent_trades(self, since: float) -> List[Tuple[float, str, int, TradeItem]]:
+        rows = self._connect().execute(
+            "SELECT timestamp, system, game, item FROM trades WHERE timestamp >= ? ORDER BY id", (since,)
+        )
+        return [(timestamp, system, game, pickle.loads(item)) for timestamp, system, game, item in rows]
+
+    def record_trade(
+        self, user_id: int, trade_item: TradeItem, system: str, game: int, timestamp: Optional[float] = None
+    ) -> "asyncio.Future[None]":
+        row = (time.time() if timestamp is None else timestamp, user_id, system, game, pickle.dumps(trade_item))
+        future = self._submit(self._insert_trade, row)
+        future.add_done_callback(self._log_failure)
+        self._trades_since_snapshot += 1
+        return future
+
+    def _insert_trade(self, row) -> None:
+        db = self._connect()
+        with db:
+            db.execute("INSERT INTO trades (timestamp, user_id, system, game, item) VALUES (?, ?, ?, ?, ?)", row)
+
+    def snapshot_due(self) -> bool:
+        return self._trades_since_snapshot >= self.snapshot_interval
+
+    async def snapshot(self, stats: BotTradeStats) -> None:
+        # Only copy the counts on the loop, so later trades can't change them mid-dump; rebuilding and pickling the
+        # stats happens on the executor. Inserts queued before this are already ahead of it there, so the snapshot
+        # covers every trade up to the max id at write time.
+        totals = stats.copy_totals()
+        self._trades_since_snapshot = 0
+        await self._submit(self._write_totals_snapshot, totals)
+
+    def _write_totals_snapshot(self, totals: Dict[int, Dict[TradeItem, int]]) -> None:
+        self._write_snapshot(pickle.dumps(BotTradeStats.from_totals(totals)), None)
+
+    def _write_snapshot(self, blob: bytes, last_trade_id: Optional[int]) -> None:
+        db = self._connect()
+        with db:
+            if last_trade_id is None:
+                last_trade_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+            db.execute(
+                "INSERT INTO snapshots (last_trade_id, timestamp, stats) VALUES (?, ?, ?)",
+                (last_trade_id, time.time(), blob),
+            )
+            db.execute("DELETE FROM snapshots WHERE id < (SELECT MAX(id) FROM snapshots)")
+
+    @staticmethod
+    def _log_failure(future: "asyncio.Future[None]") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to record trade", exc_info=future.exception())
+
+    def close(self) -> None:
+        self._executor.submit(self._close_db)
+        self._executor.shutdown(wait=True)
+
+    def _close_db(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
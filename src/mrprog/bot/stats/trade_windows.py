@@ -0,0 +1,95 @@
+import collections
+import time
+from typing import Deque, Dict, List, Literal, Optional, Tuple
+
+from mrprog.utils.types import TradeItem
+
+# Window name -> (bucket width in seconds, number of buckets summed to answer a query)
+WINDOWS: Dict[str, Tuple[int, int]] = {
+    "1h": (60, 60),
+    "24h": (3600, 24),
+    "7d": (86400, 7),
+    "30d": (86400, 30),
+}
+WindowLiteral = Literal["1h", "24h", "7d", "30d"]
+
+
+class TradeBucket:
+    __slots__ = ("start", "total", "items", "platforms")
+
+    def __init__(self, start: int):
+        self.start = start
+        self.total = 0
+        self.items: Dict[Tuple[int, TradeItem], int] = collections.Counter()
+        self.platforms: Dict[Tuple[str, int], int] = collections.Counter()
+
+
+class TradeWindowStats:
+    """Trade counts rolled up into minute, hour and day buckets.
+
+    Each trade is added to the current bucket of every granularity, and buckets that have aged out of the longest
+    window using that granularity are dropped. A window query only merges the buckets for that window, so its cost
+    doesn't depend on how many trades have ever been made.
+    """
+
+    def __init__(self):
+        self.retention: Dict[int, int] = {}
+        for width, count in WINDOWS.values():
+            self.retention[width] = max(self.retention.get(width, 0), count)
+        self.buckets: Dict[int, Deque[TradeBucket]] = {width: collections.deque() for width in self.retention}
+
+    @property
+    def max_age(self) -> int:
+        return max(width * count for width, count in self.retention.items())
+
+    def add_trade(self, trade_item: TradeItem, system: str, game: int, timestamp: Optional[float] = None) -> None:
+        if timestamp is None:
+            timestamp = time.time()
+
+        for width, buckets in self.buckets.items():
+            start = int(timestamp // width) * width
+            if not buckets or buckets[-1].start < start:
+                buckets.append(TradeBucket(start))
+                self._expire(width, start)
+            bucket = buckets[-1]
+            if bucket.start != start:
+                # Out of order timestamp from an older bucket, which can only happen while replaying history
+                bucket = next((b for b in buckets if b.start == start), None)
+                if bucket is None:
+                    continue
+
+            bucket.total += 1
+            bucket.items[(game, trade_item)] += 1
+            bucket.platforms[(system, game)] += 1
+
+    def _expire(self, width: int, newest_start: int) -> None:
+        buckets = self.buckets[width]
+        oldest_start = newest_start - (self.retention[width] - 1) * width
+        while buckets and buckets[0].start < oldest_start:
+            buckets.popleft()
+
+    def _window_buckets(self, window: str, now: Optional[float] = None) -> List[TradeBucket]:
+        width, count = WINDOWS[window]
+        if now is None:
+            now = time.time()
+        oldest_start = int(now // width) * width - (count - 1) * width
+        return [bucket for bucket in self.buckets[width] if bucket.start >= oldest_start]
+
+    def get_total_trade_count(self, window: str, now: Optional[float] = None) -> int:
+        return sum(bucket.total for bucket in self._window_buckets(window, now))
+
+    def get_trades_by_trade_count(
+        self, window: str, limit: Optional[int] = None, now: Optional[float] = None
+    ) -> List[Tuple[Tuple[int, TradeItem], int]]:
+        merged = collections.Counter()
+        for bucket in self._window_buckets(window, now):
+            merged.update(bucket.items)
+        return merged.most_common(limit)
+
+    def get_platforms_by_trade_count(
+        self, window: str, now: Optional[float] = None
+    ) -> List[Tuple[Tuple[str, int], int]]:
+        merged = collections.Counter()
+        for bucket in self._window_buckets(window, now):
+            merged.update(bucket.platforms)
+        return merged.most_common()
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+
+class RenderTarget:
+    def __init__(
+        self,
+        message: discord.Message,
+        render: Callable[[], discord.Embed],
+        min_interval: float,
+        initial_embed: Optional[discord.Embed] = None,
+    ):
+        self.message = message
+        self.render = render
+        self.min_interval = min_interval
+        self.dirty = asyncio.Event()
+        self.last_edit = 0.0
+        self.last_digest = self.digest(initial_embed) if initial_embed is not None else None
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def digest(embed: discord.Embed) -> str:
+        return hashlib.sha1(json.dumps(embed.to_dict(), sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StatusRenderer:
+    """Keeps status messages in sync with the state they display.
+
+    Each target sleeps until it is notified of a change, then coalesces any further notifications that arrive
+    within its own ``min_interval`` window into a single render. Renders that produce the same embed as the one
+    already on the message are dropped instead of being sent to Discord.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.targets: Dict[str, RenderTarget] = {}
+
+    def add_target(
+        self,
+        name: str,
+        message: discord.Message,
+        render: Callable[[], discord.Embed],
+        min_interval: float = 1.0,
+        initial_embed: Optional[discord.Embed] = None,
+    ) -> None:
+        target = RenderTarget(message, render, min_interval, initial_embed)
+        target.task = asyncio.create_task(self._run(name, target))
+        self.targets[name] = target
+
+    def notify(self, name: str) -> None:
+        target = self.targets.get(name)
+        if target is not None:
+            target.dirty.set()
+
+    async def _run(self, name: str, target: RenderTarget) -> None:
+        while True:
+            await target.dirty.wait()
+
+            delay = target.last_edit + target.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            while self.bot.is_ws_ratelimited():
+                await asyncio.sleep(target.min_interval)
+
+            # Clear before rendering so that changes made while the edit is in flight trigger another pass
+            target.dirty.clear()
+            try:
+                embed = target.render()
+                digest = target.digest(embed)
+                if digest == target.last_digest:
+                    continue
+
+                await target.message.edit(content="", embed=embed)
+                target.last_digest = digest
+                target.last_edit = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Failed to render status message {name}")
+                target.last_edit = time.monotonic()
+
+    async def stop(self) -> None:
+        for target in self.targets.values():
+            target.task.cancel()
+        for target in self.targets.values():
+            try:
+                await target.task
+            except asyncio.CancelledError:
+                pass
+        self.targets.clear()
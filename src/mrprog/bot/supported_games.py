@@ -1,4 +1,5 @@
-from typing import Literal, Dict
+import threading
+from typing import Callable, Dict, Generic, Iterable, Iterator, Literal, Mapping, Tuple, TypeVar
 
 from mmbn.gamedata.chip_list import ChipList
 from mmbn.gamedata.ncp_list import NcpList
@@ -7,18 +8,46 @@ SUPPORTED_GAMES = {"switch": [3, 4, 5, 6], "steam": [3, 4, 5, 6]}
 SupportedGameLiteral = Literal[3, 4, 5, 6]
 SupportedPlatformLiteral = Literal["Switch", "Steam"]
 
+T = TypeVar("T")
 
-CHIP_LISTS: Dict[int, ChipList] = {
-    3: ChipList(3),
-    4: ChipList(4),
-    5: ChipList(5),
-    6: ChipList(6)
-}
 
+class LazyGameData(Mapping[int, T], Generic[T]):
+    """Per-game game data that is only built the first time a game is looked up.
 
-NCP_LISTS: Dict[int, NcpList] = {
-    3: NcpList(3),
-    4: NcpList(4),
-    5: NcpList(5),
-    6: NcpList(6)
-}
+    Iteration and membership cover the supported games, but ``load`` can build any game (e.g. for migrating old
+    stats), and every caller shares the same instance per game.
+    """
+
+    def __init__(self, factory: Callable[[int], T], games: Iterable[int]):
+        self._factory = factory
+        self._games: Tuple[int, ...] = tuple(games)
+        self._instances: Dict[int, T] = {}
+        self._lock = threading.Lock()
+
+    def load(self, game: int) -> T:
+        instance = self._instances.get(game)
+        if instance is None:
+            # Stats loading runs on a worker thread, so don't let two threads build the same list
+            with self._lock:
+                instance = self._instances.get(game)
+                if instance is None:
+                    instance = self._instances[game] = self._factory(game)
+        return instance
+
+    def __getitem__(self, game: int) -> T:
+        if game not in self._games:
+            raise KeyError(game)
+        return self.load(game)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._games)
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+
+_ALL_SUPPORTED_GAMES = sorted({game for games in SUPPORTED_GAMES.values() for game in games})
+
+CHIP_LISTS: LazyGameData[ChipList] = LazyGameData(ChipList, _ALL_SUPPORTED_GAMES)
+
+NCP_LISTS: LazyGameData[NcpList] = LazyGameData(NcpList, _ALL_SUPPORTED_GAMES)
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TopicMessage:
+    __slots__ = ("topic", "levels", "payload", "retained")
+
+    def __init__(self, topic: str, levels: Tuple[str, ...], payload: bytes, retained: bool = False):
+        self.topic = topic
+        self.levels = levels
+        self.payload = payload
+        # True for a retained message replayed by the broker on subscribe, rather than one published just now
+        self.retained = retained
+
+
+TopicCallback = Callable[[TopicMessage], None]
+
+
+class _TopicNode:
+    __slots__ = ("children", "callbacks")
+
+    def __init__(self):
+        self.children: Dict[str, "_TopicNode"] = {}
+        self.callbacks: List[TopicCallback] = []
+
+
+class TopicDispatcher:
+    """Routes MQTT messages to callbacks through a trie of topic filters.
+
+    Filters are stored one level per node, with ``+`` and ``#`` as ordinary child keys, so matching a message
+    walks at most the topic's depth (branching only where a wildcard is registered) instead of testing every
+    filter. The topic is split once and the levels are handed to callbacks, so they don't need to parse it again.
+    Any number of callbacks can share a filter.
+    """
+
+    def __init__(self):
+        self._root = _TopicNode()
+
+    def subscribe(self, topic_filter: str, callback: TopicCallback) -> Callable[[], None]:
+        """Register a callback, returning a function that unregisters it."""
+        node = self._root
+        for level in topic_filter.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _TopicNode()
+            node = child
+        node.callbacks.append(callback)
+        return lambda: self.unsubscribe(topic_filter, callback)
+
+    def unsubscribe(self, topic_filter: str, callback: TopicCallback) -> None:
+        path = [self._root]
+        levels = topic_filter.split("/")
+        for level in levels:
+            child = path[-1].children.get(level)
+            if child is None:
+                return
+            path.append(child)
+
+        try:
+            path[-1].callbacks.remove(callback)
+        except ValueError:
+            return
+
+        # Prune nodes that no longer lead to any callback
+        for depth in range(len(levels), 0, -1):
+            node = path[depth]
+            if node.callbacks or node.children:
+                break
+            del path[depth - 1].children[levels[depth - 1]]
+
+    def _collect(self, node: _TopicNode, levels: Tuple[str, ...], depth: int, out: List[TopicCallback]) -> None:
+        multi_level = node.children.get("#")
+        if multi_level is not None:
+            out.extend(multi_level.callbacks)
+        if depth == len(levels):
+            out.extend(node.callbacks)
+            return
+
+        child = node.children.get(levels[depth])
+        if child is not None:
+            self._collect(child, levels, depth + 1, out)
+        single_level = node.children.get("+")
+        if single_level is not None:
+            self._collect(single_level, levels, depth + 1, out)
+
+    def dispatch(self, topic: str, payload: bytes, retained: bool = False) -> int:
+        """Call every callback whose filter matches the topic, returning how many there were."""
+        message = TopicMessage(topic, tuple(topic.split("/")), payload, retained)
+        callbacks: List[TopicCallback] = []
+        self._collect(self._root, message.levels, 0, callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception(f"Callback for {topic} failed")
+        return len(callbacks)
+
+    async def wait_for(self, topic_filter: str, timeout: Optional[float] = None) -> TopicMessage:
+        """Wait for the next message matching the filter, raising asyncio.TimeoutError after ``timeout`` seconds."""
+        future = asyncio.get_running_loop().create_future()
+
+        def on_message(message: TopicMessage) -> None:
+            if not future.done():
+                future.set_result(message)
+
+        unsubscribe = self.subscribe(topic_filter, on_message)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            unsubscribe()
@@ -0,0 +1,130 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from mrprog.bot.metrics import REGISTRY, MetricsRegistry
+
+GameKey = Tuple[str, int]
+
+
+class ExponentialAverage:
+    __slots__ = ("alpha", "value", "samples")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self.samples = 0
+
+    def add(self, sample: float) -> float:
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+        self.samples += 1
+        return self.value
+
+
+class TradeDurationEstimator:
+    """Rolling estimate of how long a trade takes, per worker and per (system, game).
+
+    A trade starts when a worker's current_trade switches to it and ends at whichever comes first of its final
+    TradeResponse or current_trade moving on, so each trade is only counted once. Durations are kept as
+    exponentially weighted averages so the estimate follows workers getting faster or slower without storing any
+    history.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        default_duration: float = 90,
+        max_duration: float = 600,
+        registry: MetricsRegistry = REGISTRY,
+    ):
+        self.alpha = alpha
+        self.default_duration = default_duration
+        # A trade that ran longer than this was almost certainly a stuck worker rather than a slow trade
+        self.max_duration = max_duration
+
+        self.by_worker: Dict[str, ExponentialAverage] = {}
+        self.by_game: Dict[GameKey, ExponentialAverage] = {}
+        self.active: Dict[str, Tuple[str, int, float]] = {}
+
+        self.estimate_gauge = registry.gauge(
+            "mrprog_trade_duration_estimate_seconds", "Current estimate of one trade's duration", ("system", "game")
+        )
+
+    def trade_started(self, worker_id: str, system: str, game: int, timestamp: Optional[float] = None) -> None:
+        self.trade_finished(worker_id, timestamp)
+        self.active[worker_id] = (system, game, time.time() if timestamp is None else timestamp)
+
+    def trade_finished(self, worker_id: str, timestamp: Optional[float] = None) -> Optional[float]:
+        """End the worker's current trade, returning how long it took if its start was seen."""
+        active = self.active.pop(worker_id, None)
+        if active is None:
+            return None
+        system, game, started = active
+        duration = (time.time() if timestamp is None else timestamp) - started
+        if 0 <= duration <= self.max_duration:
+            self.add_duration(worker_id, system, game, duration)
+        return duration
+
+    def add_duration(self, worker_id: str, system: str, game: int, duration: float) -> None:
+        if worker_id not in self.by_worker:
+            self.by_worker[worker_id] = ExponentialAverage(self.alpha)
+        self.by_worker[worker_id].add(duration)
+
+        key = (system, game)
+        if key not in self.by_game:
+            self.by_game[key] = ExponentialAverage(self.alpha)
+        estimate = self.by_game[key].add(duration)
+        self.estimate_gauge.set(estimate, system=system, game=game)
+
+    def game_duration(self, system: str, game: int) -> float:
+        average = self.by_game.get((system, game))
+        return average.value if average is not None else self.default_duration
+
+    def worker_duration(self, worker_id: str, system: str, game: int) -> float:
+        average = self.by_worker.get(worker_id)
+        return average.value if average is not None else self.game_duration(system, game)
+
+    def remaining(self, worker_id: str, now: Optional[float] = None) -> float:
+        """Expected time until a worker finishes its current trade, 0 if it is idle."""
+        active = self.active.get(worker_id)
+        if active is None:
+            return 0
+        system, game, started = active
+        elapsed = (time.time() if now is None else now) - started
+        # Past its usual duration, assume it's about to finish rather than predicting a negative wait
+        return max(self.worker_duration(worker_id, system, game) - elapsed, 0)
+
+    def queue_etas(
+        self, system: str, game: int, workers: Iterable[str], count: int, now: Optional[float] = None
+    ) -> Optional[List[float]]:
+        """Expected wait for each of the first ``count`` queued trades for a game, served by the given live workers.
+
+        Each trade goes to whichever worker frees up first, so this simulates handing them out in order. Returns
+        None if no worker can serve the game.
+        """
+        now = time.time() if now is None else now
+        free_at = sorted(
+            (self.remaining(worker_id, now), self.worker_duration(worker_id, system, game)) for worker_id in workers
+        )
+        if not free_at:
+            return None
+
+        etas = []
+        for _ in range(count):
+            wait, duration = free_at[0]
+            etas.append(wait)
+            # Only a handful of workers serve each game, so re-sorting is cheaper than keeping a heap in sync
+            free_at[0] = (wait + duration, duration)
+            free_at.sort()
+        return etas
+
+
+def format_eta(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "<1m"
+    if minutes < 60:
+        return f"~{minutes}m"
+    return f"~{minutes // 60}h {minutes % 60:02d}m"
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TradeIdAllocator:
+    """Hands out trade ids from blocks reserved with a single durable write.
+
+    The persisted value is a high-water mark: every id below it may have been handed out. Reserving a block
+    writes the new mark before any id from that block is used, so after a crash or restart allocation resumes
+    at the mark. Ids left over from the previous block are skipped rather than reused, which keeps ids
+    monotonic and unique at the cost of gaps.
+
+    The next block is reserved in the background once the current one runs low, so submits normally never wait
+    on the write.
+    """
+
+    def __init__(
+        self, reserve: Callable[[int], Awaitable[None]], block_size: int = 100, refill_at: Optional[int] = None
+    ):
+        self._reserve = reserve
+        self.block_size = block_size
+        self.refill_at = refill_at if refill_at is not None else max(block_size // 4, 1)
+
+        self.next_id: Optional[int] = None
+        self.limit = 0
+        self._refill_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self, high_water_mark: int) -> None:
+        self.next_id = high_water_mark
+        self.limit = high_water_mark
+        await self._reserve_block()
+
+    @property
+    def remaining(self) -> int:
+        return self.limit - self.next_id if self.next_id is not None else 0
+
+    async def allocate(self) -> int:
+        if self.next_id is None:
+            raise RuntimeError("TradeIdAllocator has not been started")
+        # Loop since other submits waiting on the same reservation may use it all up first
+        while self.remaining <= 0:
+            await self._reserve_block()
+        if self.remaining <= self.refill_at and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+
+        trade_id = self.next_id
+        self.next_id += 1
+        return trade_id
+
+    async def _reserve_block(self) -> None:
+        async with self._lock:
+            # Someone else may have reserved while we waited for the lock
+            if self.remaining > self.refill_at:
+                return
+            new_limit = max(self.limit, self.next_id) + self.block_size
+            await self._reserve(new_limit)
+            self.limit = new_limit
+            logger.debug(f"Reserved trade ids up to {new_limit}")
+
+    async def _refill(self) -> None:
+        try:
+            await self._reserve_block()
+        except Exception:
+            # Not fatal yet, the next allocation retries and only blocks once the current block is used up
+            logger.exception("Failed to reserve trade ids")
+
+    async def close(self) -> None:
+        if self._refill_task is not None:
+            await self._refill_task
@@ -0,0 +1,135 @@
+import collections
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+from mrprog.utils.trade import TradeRequest
+
+from mrprog.bot.metrics import REGISTRY, MetricsRegistry
+
+LABELS = ("system", "game", "worker")
+
+
+def request_key(request: TradeRequest) -> Tuple[Hashable, ...]:
+    """Identifies a request across the AMQP message and the worker's retained current_trade copy of it."""
+    return request.user_id, request.system, request.game, str(request.trade_item)
+
+
+class TradeTimeline:
+    __slots__ = ("key", "system", "game", "worker", "received", "published", "picked_up", "room_code_sent")
+
+    def __init__(self, key: Tuple[Hashable, ...], system: str, game: int):
+        self.key = key
+        self.system = system
+        self.game = game
+        self.worker = ""
+        self.received: Optional[float] = None
+        self.published: Optional[float] = None
+        self.picked_up: Optional[float] = None
+        self.room_code_sent: Optional[float] = None
+
+
+class TradeLifecycleTracker:
+    """Timestamps each step of a trade and feeds the gaps between them into histograms.
+
+    The steps are: interaction received, handed to the publisher, picked up by a worker (its current_trade
+    changes to the request), room code DM sent, and final response received. Trades restored from the queue
+    journal after a restart only have the later steps, so only those gaps are recorded for them.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, max_tracked: int = 10000):
+        self.max_tracked = max_tracked
+        self.timelines: Dict[str, TradeTimeline] = collections.OrderedDict()
+        self._correlation_ids: Dict[Tuple[Hashable, ...], str] = {}
+
+        self.publish_latency = registry.histogram(
+            "mrprog_trade_publish_seconds", "Time from the interaction to the broker confirming the request", LABELS
+        )
+        self.queue_wait = registry.histogram(
+            "mrprog_trade_queue_wait_seconds",
+            "Time from handing a request to the publisher to a worker picking it up",
+            LABELS,
+        )
+        self.room_code_latency = registry.histogram(
+            "mrprog_trade_room_code_seconds", "Time from a worker picking up a request to the room code DM", LABELS
+        )
+        self.execution_time = registry.histogram(
+            "mrprog_trade_execution_seconds", "Time from a worker picking up a request to its final response", LABELS
+        )
+        self.total_time = registry.histogram(
+            "mrprog_trade_total_seconds", "Time from the interaction (or publish) to the final response", LABELS
+        )
+        self.completed = registry.counter(
+            "mrprog_trades_completed_total", "Final trade responses by status", LABELS + ("status",)
+        )
+
+    def _observe(self, histogram, timeline: TradeTimeline, start: Optional[float], end: Optional[float]) -> None:
+        if start is not None and end is not None:
+            histogram.observe(max(end - start, 0), system=timeline.system, game=timeline.game, worker=timeline.worker)
+
+    def submitted(
+        self, correlation_id: str, request: TradeRequest, received: Optional[float], published: Optional[float]
+    ) -> None:
+        timeline = TradeTimeline(request_key(request), request.system, request.game)
+        timeline.received = received
+        timeline.published = published
+        self.timelines[correlation_id] = timeline
+        self._correlation_ids[timeline.key] = correlation_id
+
+        while len(self.timelines) > self.max_tracked:
+            self._forget(*self.timelines.popitem(last=False))
+
+    def publish_confirmed(
+        self, request: TradeRequest, received: Optional[float], timestamp: Optional[float] = None
+    ) -> None:
+        # Not looked up by timeline, since a worker may already have finished the trade by the time the confirm
+        # arrives. No worker label either, so the series doesn't depend on how that race went.
+        if received is not None:
+            now = time.time() if timestamp is None else timestamp
+            self.publish_latency.observe(max(now - received, 0), system=request.system, game=request.game, worker="")
+
+    def _forget(self, correlation_id: str, timeline: TradeTimeline) -> None:
+        if self._correlation_ids.get(timeline.key) == correlation_id:
+            del self._correlation_ids[timeline.key]
+
+    def picked_up(self, request: TradeRequest, worker_id: str, timestamp: Optional[float] = None) -> Optional[str]:
+        correlation_id = self._correlation_ids.pop(request_key(request), None)
+        timeline = self.timelines.get(correlation_id) if correlation_id is not None else None
+        if timeline is None or timeline.picked_up is not None:
+            return None
+
+        timeline.worker = worker_id
+        timeline.picked_up = time.time() if timestamp is None else timestamp
+        self._observe(self.queue_wait, timeline, timeline.published, timeline.picked_up)
+        return correlation_id
+
+    def room_code_sent(self, correlation_id: str, timestamp: Optional[float] = None) -> None:
+        timeline = self.timelines.get(correlation_id)
+        if timeline is None:
+            return
+        timeline.room_code_sent = time.time() if timestamp is None else timestamp
+        self._observe(self.room_code_latency, timeline, timeline.picked_up, timeline.room_code_sent)
+
+    def finished(
+        self, correlation_id: str, worker_id: str, status, timestamp: Optional[float] = None
+    ) -> Optional[TradeTimeline]:
+        timeline = self.timelines.pop(correlation_id, None)
+        if timeline is None:
+            return None
+        self._forget(correlation_id, timeline)
+
+        if not timeline.worker:
+            timeline.worker = worker_id
+        now = time.time() if timestamp is None else timestamp
+        self._observe(self.execution_time, timeline, timeline.picked_up, now)
+        self._observe(self.total_time, timeline, timeline.received or timeline.published, now)
+        self.completed.inc(system=timeline.system, game=timeline.game, worker=timeline.worker, status=str(status))
+        return timeline
+
+    def discard(self, correlation_id: str) -> None:
+        timeline = self.timelines.pop(correlation_id, None)
+        if timeline is not None:
+            self._forget(correlation_id, timeline)
+
+    def clear(self) -> None:
+        self.timelines.clear()
+        self._correlation_ids.clear()
@@ -0,0 +1,117 @@
+import array
+import math
+import time
+from typing import Dict, List, Optional
+
+from mrprog.utils.trade import TradeResponse
+
+from mrprog.bot.metrics import percentile
+
+SUCCESS = 0
+FAILURE = 1
+CRITICAL_FAILURE = 2
+
+OUTCOMES = {
+    TradeResponse.SUCCESS: SUCCESS,
+    TradeResponse.FAILURE: FAILURE,
+    TradeResponse.CRITICAL_FAILURE: CRITICAL_FAILURE,
+}
+
+
+class OutcomeRing:
+    """The last ``capacity`` trade outcomes of one worker, in preallocated arrays that never grow."""
+
+    __slots__ = ("capacity", "timestamps", "durations", "outcomes", "next_slot", "count")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array.array("d", bytes(8 * capacity))
+        # NaN when the trade's start wasn't seen, e.g. it began before the bot restarted
+        self.durations = array.array("d", bytes(8 * capacity))
+        self.outcomes = bytearray(capacity)
+        self.next_slot = 0
+        self.count = 0
+
+    def append(self, timestamp: float, duration: Optional[float], outcome: int) -> None:
+        slot = self.next_slot
+        self.timestamps[slot] = timestamp
+        self.durations[slot] = math.nan if duration is None else duration
+        self.outcomes[slot] = outcome
+        self.next_slot = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def slots(self) -> List[int]:
+        """Filled slot indexes from oldest to newest."""
+        start = self.next_slot - self.count
+        return [(start + offset) % self.capacity for offset in range(self.count)]
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class WorkerSummary:
+    __slots__ = ("samples", "trades_per_hour", "success_rate", "critical_failures", "p50", "p95")
+
+    def __init__(self, samples, trades_per_hour, success_rate, critical_failures, p50, p95):
+        self.samples: int = samples
+        self.trades_per_hour: float = trades_per_hour
+        self.success_rate: float = success_rate
+        self.critical_failures: int = critical_failures
+        self.p50: Optional[float] = p50
+        self.p95: Optional[float] = p95
+
+
+class WorkerHistory:
+    """Recent trade outcomes and durations for every worker, in a fixed amount of memory per worker."""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.rings: Dict[str, OutcomeRing] = {}
+
+    def record(
+        self, worker_id: str, status, duration: Optional[float] = None, timestamp: Optional[float] = None
+    ) -> None:
+        ring = self.rings.get(worker_id)
+        if ring is None:
+            ring = self.rings[worker_id] = OutcomeRing(self.capacity)
+        ring.append(time.time() if timestamp is None else timestamp, duration, OUTCOMES.get(status, FAILURE))
+
+    def summary(self, worker_id: str, now: Optional[float] = None, window: float = 3600) -> Optional[WorkerSummary]:
+        """Stats over the buffered outcomes. Throughput only counts successful trades within the last ``window``."""
+        ring = self.rings.get(worker_id)
+        if ring is None or not ring:
+            return None
+        now = time.time() if now is None else now
+
+        successes = 0
+        critical_failures = 0
+        recent_successes = 0
+        durations = []
+        for slot in ring.slots():
+            outcome = ring.outcomes[slot]
+            if outcome == SUCCESS:
+                successes += 1
+                if now - ring.timestamps[slot] <= window:
+                    recent_successes += 1
+            elif outcome == CRITICAL_FAILURE:
+                critical_failures += 1
+            duration = ring.durations[slot]
+            if not math.isnan(duration):
+                durations.append(duration)
+
+        durations.sort()
+        return WorkerSummary(
+            samples=len(ring),
+            trades_per_hour=recent_successes * 3600 / window,
+            success_rate=successes / len(ring),
+            critical_failures=critical_failures,
+            p50=percentile(durations, 0.5) if durations else None,
+            p95=percentile(durations, 0.95) if durations else None,
+        )
+
+
+def format_seconds(seconds: float) -> str:
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
@@ -0,0 +1,190 @@
+import collections
+import json
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from mrprog.utils.trade import TradeRequest
+
+
+def _decode(payload: bytes) -> str:
+    return payload.decode("utf-8")
+
+
+def _parse_flag(payload: bytes) -> bool:
+    return payload == b"1"
+
+
+def _parse_version(payload: bytes) -> Dict[str, str]:
+    return json.loads(payload.decode("utf-8"))
+
+
+def _parse_trade(payload: bytes) -> Optional[TradeRequest]:
+    return TradeRequest.from_bytes(payload)
+
+
+class WorkerRecord:
+    ONLINE = "online"
+    DISABLED = "disabled"
+    OFFLINE = "offline"
+
+    # worker/<id>/<field> topics and how to parse their payloads. An empty payload resets the field.
+    FIELDS: Dict[str, Callable[[bytes], object]] = {
+        "hostname": _decode,
+        "address": _decode,
+        "system": _decode,
+        "game": lambda payload: int(payload.decode("utf-8")),
+        "available": _parse_flag,
+        "enabled": _parse_flag,
+        "version": _parse_version,
+        "current_trade": _parse_trade,
+    }
+    DEFAULTS = {
+        "hostname": "",
+        "address": "",
+        "system": "",
+        "game": 0,
+        "available": None,
+        "enabled": False,
+        "version": None,
+        "current_trade": None,
+    }
+
+    __slots__ = ("worker_id", "last_seen", "sends_heartbeats", "stale") + tuple(FIELDS)
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.hostname: str = ""
+        self.address: str = ""
+        self.system: str = ""
+        self.game: int = 0
+        # None until the worker has announced itself; workers are only listed once it has
+        self.available: Optional[bool] = None
+        self.enabled: bool = False
+        self.version: Optional[Dict[str, str]] = None
+        self.current_trade: Optional[TradeRequest] = None
+
+        # When the worker last published anything live (retained replays don't count)
+        self.last_seen: Optional[float] = None
+        self.sends_heartbeats = False
+        self.stale = False
+
+    def lag(self, now: float) -> Optional[float]:
+        return now - self.last_seen if self.last_seen is not None else None
+
+    @property
+    def state(self) -> Optional[str]:
+        if self.available is None:
+            return None
+        if not self.available:
+            return self.OFFLINE
+        return self.ONLINE if self.enabled else self.DISABLED
+
+    @property
+    def platform(self) -> Tuple[str, int]:
+        return self.system, self.game
+
+
+class WorkerRegistry:
+    """Every worker's state, parsed once as its retained MQTT topics change.
+
+    Workers are indexed by (system, game) and by state, so the status embeds, autocomplete and ETA estimates
+    read what they need directly instead of scanning and decoding the raw topic cache.
+    """
+
+    def __init__(self):
+        self.workers: Dict[str, WorkerRecord] = {}
+        self.by_platform: Dict[Tuple[str, int], Set[str]] = collections.defaultdict(set)
+        self.by_state: Dict[str, Set[str]] = collections.defaultdict(set)
+
+    def __contains__(self, worker_id: str) -> bool:
+        return worker_id in self.workers
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+    def get(self, worker_id: str) -> Optional[WorkerRecord]:
+        return self.workers.get(worker_id)
+
+    def update(self, worker_id: str, field: str, payload: bytes) -> Tuple[WorkerRecord, object]:
+        """Apply a worker/<id>/<field> message, returning the record and the field's previous value.
+
+        Fields the registry doesn't know about are ignored and return None as the previous value.
+        """
+        record = self.workers.get(worker_id)
+        if record is None:
+            record = self.workers[worker_id] = WorkerRecord(worker_id)
+
+        parser = WorkerRecord.FIELDS.get(field)
+        if parser is None:
+            return record, None
+
+        # Parse before touching the indexes, so a bad payload leaves the worker indexed as it was
+        value = parser(payload) if payload else WorkerRecord.DEFAULTS[field]
+        previous = getattr(record, field)
+        self._unindex(record)
+        setattr(record, field, value)
+        self._index(record)
+        return record, previous
+
+    def mark_seen(self, worker_id: str, timestamp: float, heartbeat: bool = False) -> None:
+        record = self.workers.get(worker_id)
+        if record is None:
+            record = self.workers[worker_id] = WorkerRecord(worker_id)
+        if record.last_seen is None or timestamp > record.last_seen:
+            record.last_seen = timestamp
+        record.sends_heartbeats = record.sends_heartbeats or heartbeat
+
+    def refresh_stale(self, now: float, heartbeat_timeout: float, busy_timeout: float) -> bool:
+        """Re-evaluate which online workers look hung, returning whether that changed for any of them.
+
+        A worker that publishes heartbeats is stale once one is overdue. One that doesn't is silent while idle,
+        so it is only flagged if it has sat on the same trade without a word for longer than any trade takes.
+        """
+        changed = False
+        for record in self.workers.values():
+            lag = record.lag(now)
+            if record.state != WorkerRecord.ONLINE or lag is None:
+                stale = False
+            elif record.sends_heartbeats:
+                stale = lag > heartbeat_timeout
+            else:
+                stale = record.current_trade is not None and lag > busy_timeout
+            if stale != record.stale:
+                record.stale = stale
+                changed = True
+        return changed
+
+    def _index(self, record: WorkerRecord) -> None:
+        if record.state is not None:
+            self.by_platform[record.platform].add(record.worker_id)
+            self.by_state[record.state].add(record.worker_id)
+
+    def _unindex(self, record: WorkerRecord) -> None:
+        for index, key in ((self.by_platform, record.platform), (self.by_state, record.state)):
+            worker_ids = index.get(key)
+            if worker_ids is not None:
+                worker_ids.discard(record.worker_id)
+                if not worker_ids:
+                    del index[key]
+
+    def listed(self) -> List[WorkerRecord]:
+        """Workers that have announced themselves, ordered by id."""
+        return sorted(
+            (record for record in self.workers.values() if record.state is not None),
+            key=lambda record: record.worker_id,
+        )
+
+    def worker_ids(self) -> List[str]:
+        return [record.worker_id for record in self.listed()]
+
+    def for_platform(self, system: str, game: int, state: Optional[str] = None) -> List[WorkerRecord]:
+        worker_ids = self.by_platform.get((system, game), set())
+        if state is not None:
+            worker_ids = worker_ids & self.by_state.get(state, set())
+        return [self.workers[worker_id] for worker_id in sorted(worker_ids)]
+
+    def in_progress(self) -> List[Tuple[str, TradeRequest]]:
+        return [
+            (worker_id, record.current_trade)
+            for worker_id, record in self.workers.items()
+            if record.current_trade is not None
+        ]